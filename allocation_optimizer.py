@@ -0,0 +1,147 @@
+from itertools import combinations, product
+from math import comb
+
+import numpy as np
+import pandas as pd
+from fund_statistics import get_fund_statistics
+from guarantee_calculation import black_scholes_put_greeks
+from utils import calculate_tax
+
+OBJECTIVES = {
+    "net_payout": "Guaranteed payout minus guarantee cost",
+    "sharpe": "Sharpe ratio",
+}
+
+def simplex_grid(n_funds, step=1, total=100):
+    """
+    Alle ganzzahligen Allokationen in step-Schritten, die sich zu total summieren
+    (Stars and Bars), als Array (Punkte, n_funds).
+    """
+    units = total // step
+    if n_funds == 1:
+        return np.array([[total]])
+    bars = np.array(list(combinations(range(units + n_funds - 1), n_funds - 1)))
+    edges = np.column_stack([np.full(len(bars), -1), bars, np.full(len(bars), units + n_funds - 1)])
+    return (np.diff(edges, axis=1) - 1) * step
+
+def _neighbourhood(candidates, radius, step, total=100):
+    """
+    Alle Gitterpunkte mit Schrittweite step im Umkreis radius (je Koordinate)
+    der Kandidaten, die auf dem Simplex liegen.
+    """
+    n_funds = candidates.shape[1]
+    offsets = np.array(list(product(range(-radius, radius + 1, step), repeat=n_funds - 1)))
+    points = candidates[:, None, :-1] + offsets[None, :, :]
+    points = points.reshape(-1, n_funds - 1)
+    points = np.column_stack([points, total - points.sum(axis=1)])
+    points = points[(points >= 0).all(axis=1) & (points <= total).all(axis=1)]
+    return np.unique(points, axis=0)
+
+def evaluate_allocations(weights, mean, cov, contribution, duration, objective="net_payout", guarantee_rate=0.0,
+                         tax_rate=0.26, setup_cost_rate=0.0, risk_free_rate=0.02, rebalancing_cost=0.00003):
+    """
+    Bewertet viele Allokationen auf einmal. weights hat die Form (K, Fonds) in
+    Prozent; Rendite und Risiko folgen aus Mittelwert-Vektor und Kovarianzmatrix
+    der Monatsrenditen, das Endkapital aus der Rentenformel wie im Szenario
+    "Expected" von run_simulation_batch und die Garantiekosten aus Black-Scholes
+    wie in calculate_option_prices. Liefert ein Dictionary von Arrays (K,).
+    """
+    weights = np.asarray(weights, dtype=float) / 100
+    monthly_return = weights @ mean - rebalancing_cost
+    monthly_variance = np.einsum("kf,fg,kg->k", weights, cov, weights)
+    volatility = np.sqrt(np.clip(monthly_variance, 0, None) * 12)
+    expected_return = monthly_return * 12
+
+    months = int(duration * 12)
+    paid_in = contribution * months
+    safe_return = np.where(monthly_return == 0, 1.0, monthly_return)
+    final_capital = contribution * np.where(monthly_return == 0, months, ((1 + monthly_return) ** months - 1) / safe_return)
+    after_tax = final_capital - calculate_tax(final_capital - paid_in, tax_rate) - paid_in * setup_cost_rate
+    guaranteed_payout = np.maximum(after_tax, paid_in * guarantee_rate)
+    guarantee_cost = black_scholes_put_greeks(paid_in, paid_in * guarantee_rate, duration, risk_free_rate, volatility)["price"]
+
+    if objective == "net_payout":
+        score = guaranteed_payout - guarantee_cost
+    elif objective == "sharpe":
+        score = (expected_return - risk_free_rate) / np.where(volatility > 0, volatility, np.nan)
+        score = np.nan_to_num(score, nan=-np.inf)
+    else:
+        raise ValueError(f"Unknown objective: {objective}")
+
+    return {
+        "score": score,
+        "expected_return": expected_return,
+        "volatility": volatility,
+        "final_capital": final_capital,
+        "guaranteed_payout": guaranteed_payout,
+        "guarantee_cost": guarantee_cost,
+    }
+
+def _ranking(evaluation, max_volatility):
+    # Zulässige Punkte nach Zielwert, unzulässige dahinter nach Überschreitung der Risikogrenze
+    if max_volatility is None:
+        return evaluation["score"]
+    excess = evaluation["volatility"] - max_volatility
+    return np.where(excess <= 0, evaluation["score"], -1e12 - excess)
+
+def optimize_allocation(selected_funds, fund_data, contribution, duration, objective="net_payout", max_volatility=None,
+                        guarantee_rate=0.0, tax_rate=0.26, setup_cost_rate=0.0, risk_free_rate=0.02,
+                        max_points=200_000, coarse_step=10, top_k=10, fund_statistics=None):
+    """
+    Sucht die ganzzahlige Allokation (1%-Schritte, Summe 100%) mit dem besten
+    Zielwert unter der Risikogrenze max_volatility (annualisiert).
+
+    Ist das vollständige 1%-Gitter kleiner als max_points (bis vier Fonds),
+    wird es komplett bewertet. Sonst (fünf Fonds: 4,6 Mio. Punkte) grob nach
+    fein: coarse_step-Gitter, dann 5%- und 1%-Gitter um die top_k besten Punkte.
+    """
+    fund_statistics = fund_statistics or get_fund_statistics(fund_data)
+    funds = [fund for fund in selected_funds if fund in fund_statistics]
+    if not funds:
+        return None
+
+    mean, cov = fund_statistics.mean(funds), fund_statistics.covariance(funds)
+    settings = dict(objective=objective, guarantee_rate=guarantee_rate, tax_rate=tax_rate,
+                    setup_cost_rate=setup_cost_rate, risk_free_rate=risk_free_rate)
+
+    def evaluate(points):
+        evaluation = evaluate_allocations(points, mean, cov, contribution, duration, **settings)
+        return evaluation, _ranking(evaluation, max_volatility)
+
+    n_funds = len(funds)
+    evaluated = 0
+    if comb(100 + n_funds - 1, n_funds - 1) <= max_points:
+        points = simplex_grid(n_funds, 1)
+        evaluation, ranking = evaluate(points)
+        evaluated = len(points)
+    else:
+        points = simplex_grid(n_funds, coarse_step)
+        radius = coarse_step
+        for step in (5, 1):
+            evaluation, ranking = evaluate(points)
+            evaluated += len(points)
+            best = points[np.argsort(ranking)[::-1][:top_k]]
+            points = _neighbourhood(best, radius, step)
+            radius = step
+        evaluation, ranking = evaluate(points)
+        evaluated += len(points)
+
+    order = np.argsort(ranking)[::-1]
+    best = order[0]
+    top = pd.DataFrame(points[order[:top_k]], columns=funds)
+    for column in ("score", "expected_return", "volatility", "guaranteed_payout", "guarantee_cost"):
+        top[column] = evaluation[column][order[:top_k]]
+
+    allocations = {fund: 0 for fund in selected_funds}
+    allocations.update({fund: int(points[best, idx]) for idx, fund in enumerate(funds)})
+    return {
+        "allocations": allocations,
+        "score": float(evaluation["score"][best]),
+        "expected_return": float(evaluation["expected_return"][best]),
+        "volatility": float(evaluation["volatility"][best]),
+        "guaranteed_payout": float(evaluation["guaranteed_payout"][best]),
+        "guarantee_cost": float(evaluation["guarantee_cost"][best]),
+        "feasible": max_volatility is None or bool(evaluation["volatility"][best] <= max_volatility),
+        "evaluated": evaluated,
+        "top": top,
+    }
@@ -1,46 +1,162 @@
+import time
+_script_started = time.perf_counter()
+
+import uuid
+
 import streamlit as st
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from io import BytesIO
 from datetime import datetime
 from config import initialize_page
 from data_fetching import fetch_logo, display_fund_details, fetch_fund_data, funds
-from simulation import perform_simulation
-from report_generation import generate_pdf_report, generate_excel_report
-from guarantee_calculation import calculate_option_prices, plot_guarantee_vs_cost, plot_sensitivity_volatility, plot_sensitivity_time
-from utils import calculate_tax  # Import der zentralen Steuerberechnungsfunktion
-
-def create_summary(simulation_results, paid_in, setup_cost_total, death_benefit_option, guarantee_rate, tax_rate):
-    result_summary = []
-    for scenario, result in simulation_results.items():
-        final_capital = result["Final Capital"]
-        gross_earnings = result["Earnings"]
-        tax = calculate_tax(gross_earnings, tax_rate)
-        after_tax = final_capital - tax - setup_cost_total
-
-        death_benefit = max(paid_in, after_tax) if death_benefit_option else after_tax
-        contribution_guarantee = paid_in * guarantee_rate
-        guaranteed_payout = max(death_benefit, contribution_guarantee)
-
-        result_summary.append({
-            "Scenario": scenario,
-            "Paid-in Capital (EUR)": paid_in,
-            "Final Capital (EUR)": final_capital,
-            "Earnings (EUR)": gross_earnings,
-            "Tax (EUR)": tax,
-            "Setup Cost (EUR)": setup_cost_total,
-            "After Tax (EUR)": after_tax,
-            "Death Benefit (EUR)": death_benefit,
-            "Guaranteed Payout (EUR)": guaranteed_payout
-        })
-
-    return pd.DataFrame(result_summary)
+from simulation import perform_simulation, create_summary
+from guarantee_monte_carlo import price_contribution_guarantee
+from guarantee_calculation import build_guarantee_surface, solve_guarantee_level, implied_volatility, solve_guarantee_batch
+from charts import render_chart_async
+from backtest import available_history_years, rolling_window_backtest, backtest_statistics
+from allocation_optimizer import OBJECTIVES, optimize_allocation
+from fund_statistics import get_fund_statistics
+from caching import memoize, copy_buffer, cache_stats
+from jobs import get_job_runner
+from instrumentation import DEBUG, rerun, stage, buffer_size, flame_summary, record_startup
+
+# Beim ersten Lauf im Prozess die Importzeit, danach nur noch Modul-Lookups
+record_startup(time.perf_counter() - _script_started)
+
+# Der Backtest lädt so viel Historie, dass es über die Laufzeit hinaus zehn Jahre Startmonate gibt
+BACKTEST_START_YEARS = 10
+
+# Gecachte Pipeline-Stufen: jede Stufe wird nur neu berechnet, wenn sich ihre Eingaben ändern
+cached_fetch_fund_data = memoize("fetch_fund_data", maxsize=32, ttl=15 * 60)(fetch_fund_data)
+cached_perform_simulation = memoize("perform_simulation", maxsize=64, ignore=("progress",))(perform_simulation)
+cached_build_guarantee_surface = memoize("build_guarantee_surface", maxsize=32)(build_guarantee_surface)
+cached_price_contribution_guarantee = memoize("price_contribution_guarantee", maxsize=256, ignore=("progress",))(price_contribution_guarantee)
+cached_rolling_window_backtest = memoize("rolling_window_backtest", maxsize=64)(rolling_window_backtest)
+cached_optimize_allocation = memoize("optimize_allocation", maxsize=64)(optimize_allocation)
+
+# report_generation (und damit fpdf) wird erst beim ersten Bericht geladen
+@memoize("generate_pdf_report", maxsize=64, copy=copy_buffer)
+def cached_generate_pdf_report(*args, **kwargs):
+    from report_generation import generate_pdf_report
+    return generate_pdf_report(*args, **kwargs)
+
+@memoize("generate_excel_report", maxsize=64, copy=copy_buffer)
+def cached_generate_excel_report(*args, **kwargs):
+    from report_generation import generate_excel_report
+    return generate_excel_report(*args, **kwargs)
 
 def main():
+    new_session = "session_started" not in st.session_state
+    st.session_state.setdefault("session_started", time.time())
+    with rerun("main", started=_script_started, new_session=new_session) as trace:
+        render_app()
+
+        if DEBUG:
+            with st.sidebar.expander("Rerun profile"):
+                st.code(flame_summary(trace))
+
+def session_id():
+    return st.session_state.setdefault("session_id", uuid.uuid4().hex)
+
+def run_job(stage_name, slot, func, *args, **kwargs):
+    """
+    Startet eine Stufe als Hintergrund-Job dieser Session (ein Job pro slot,
+    identische Jobs anderer Sessions werden mitbenutzt). Schnelle Ergebnisse,
+    z.B. aus dem Cache, werden kurz abgewartet, um Flackern zu vermeiden.
+    """
+    job = get_job_runner().submit(stage_name, func, *args, owner=session_id(), slot=slot, **kwargs)
+    job.wait(0.25)
+    return job
+
+@st.fragment(run_every=0.5)
+def show_job_progress(key, label, format_partial=None):
+    # Aktualisiert nur diesen Ausschnitt; ist der Job fertig, läuft die ganze Seite neu
+    job = get_job_runner().get(key)
+    if job is None or job.done:
+        st.rerun()
+    text = label
+    if job.partial is not None and format_partial is not None:
+        text = f"{label}: {format_partial(job.partial)}"
+    st.progress(min(job.progress, 1.0), text=text)
+
+def load_fund_data(selected_funds, history_years=None):
+    """
+    Kurse und Kennzahlen werden einmal für alle Fonds geladen bzw. berechnet
+    (je Marktdatenstand und Historienlänge); eine Fondsauswahl ist nur ein Ausschnitt davon.
+    """
+    universe_data = cached_fetch_fund_data(list(funds), history_years=history_years)
+    fund_statistics = get_fund_statistics(universe_data)
+    return {fund: universe_data[fund] for fund in selected_funds}, fund_statistics
+
+def apply_optimized_allocation(selected_funds, contribution, duration, objective, max_volatility, guarantee_rate, setup_cost_rate, tax_rate):
+    # Callback vor dem nächsten Rerun: übernimmt das Ergebnis in die Allokations-Eingaben
+    with stage("optimize_allocation", funds=len(selected_funds)):
+        fund_data, fund_statistics = load_fund_data(selected_funds)
+        result = cached_optimize_allocation(
+            selected_funds, fund_data, contribution, duration, objective=objective, max_volatility=max_volatility,
+            guarantee_rate=guarantee_rate, tax_rate=tax_rate, setup_cost_rate=setup_cost_rate, fund_statistics=fund_statistics
+        )
+    st.session_state["optimizer_result"] = (tuple(selected_funds), result)
+    if result is not None:
+        for fund, allocation in result["allocations"].items():
+            st.session_state[f"allocation_{fund}"] = allocation
+
+def render_app():
     initialize_page()
-    fetch_logo()
+    with stage("fetch_logo"):
+        fetch_logo()
+
+    mode = st.sidebar.radio("Mode", ["Simulation", "Inverse guarantee solver"], horizontal=True)
+    if mode == "Inverse guarantee solver":
+        with stage("inverse_solver"):
+            render_inverse_solver()
+    else:
+        render_simulation()
 
+    with st.sidebar.expander("Cache statistics"):
+        st.dataframe(cache_stats())
+        st.write(get_job_runner().stats())
+
+def render_inverse_solver():
+    contribution = st.sidebar.number_input("Monthly Contribution (€)", min_value=10, value=100, step=10)
+    duration = st.sidebar.number_input("Investment Horizon (Years)", min_value=1, max_value=40, value=20, step=1)
+    risk_free_rate = st.sidebar.number_input("Risk-free Rate (%)", min_value=-2.0, max_value=10.0, value=2.0, step=0.1) / 100
+    volatility = st.sidebar.number_input("Fund Volatility (% p.a.)", min_value=1.0, max_value=100.0, value=15.0, step=0.5) / 100
+    paid_in = contribution * duration * 12
+
+    st.subheader("Maximum Guarantee for a Cost Budget")
+    budget = st.number_input("Guarantee budget (EUR)", min_value=0.0, value=round(paid_in * 0.02, 2), step=10.0)
+    level = float(solve_guarantee_level(budget / paid_in * 100, duration, risk_free_rate, volatility))
+    st.write(
+        f"With {budget:,.2f} EUR ({budget / paid_in * 100:.2f}% of {paid_in:,.0f} EUR paid-in capital) "
+        f"the highest affordable contribution guarantee is {level * 100:.2f}%."
+    )
+
+    st.subheader("Implied Volatility of a Quoted Guarantee Price")
+    quoted_level = st.slider("Guarantee level (%)", 1, 100, 50) / 100
+    quoted_price = st.number_input("Quoted guarantee price (EUR)", min_value=0.0, value=round(paid_in * 0.01, 2), step=10.0)
+    implied = float(implied_volatility(quoted_price / paid_in * 100, quoted_level, duration, risk_free_rate))
+    if np.isnan(implied):
+        st.warning("No volatility between 0% and 500% reproduces this price.")
+    else:
+        st.write(f"A price of {quoted_price:,.2f} EUR for a {quoted_level * 100:.0f}% guarantee implies {implied * 100:.2f}% volatility p.a.")
+
+    st.subheader("Client Batch")
+    st.caption("CSV with columns contribution, duration and budget (EUR) and/or guarantee_rate and quoted_price (EUR); "
+               "optional volatility and risk_free_rate per client.")
+    uploaded = st.file_uploader("Client file", type="csv")
+    if uploaded is not None:
+        clients = pd.read_csv(uploaded)
+        missing = {"contribution", "duration"} - set(clients.columns)
+        if missing:
+            st.error(f"Missing columns: {', '.join(sorted(missing))}")
+            return
+        results = solve_guarantee_batch(clients, risk_free_rate=risk_free_rate, volatility=volatility)
+        st.dataframe(results)
+        st.download_button("Download results as CSV", data=results.to_csv(index=False), file_name="guarantee_solver_results.csv",
+                           mime="text/csv")
+
+def render_simulation():
     # Sidebar Inputs
     selected_funds = st.sidebar.multiselect("Select funds (up to 5)", list(funds.keys()), max_selections=5)
     contribution = st.sidebar.number_input("Monthly Contribution (€)", min_value=10, value=100, step=10)
@@ -56,13 +172,36 @@ def main():
     advisor_name = st.sidebar.text_input("Advisor Name (optional)", value="Advisor")
     client_name = st.sidebar.text_input("Client Name (optional)", value="Client")
 
+    tax_rate = 0.26
     allocations = {}
     total_allocation = 0
 
     if selected_funds:
+        with st.sidebar.expander("Allocation optimizer"):
+            objective = st.selectbox("Objective", list(OBJECTIVES), format_func=OBJECTIVES.get)
+            max_volatility = st.slider("Max. volatility (% p.a.)", 1.0, 40.0, 15.0, step=0.5) / 100
+            st.button(
+                "Optimize allocation", on_click=apply_optimized_allocation,
+                args=(selected_funds, contribution, duration, objective, max_volatility, guarantee_rate, setup_cost_rate, tax_rate)
+            )
+
+            optimized_funds, result = st.session_state.get("optimizer_result", ((), None))
+            if optimized_funds == tuple(selected_funds):
+                if result is None:
+                    st.error("No price data available for the selected funds.")
+                else:
+                    if not result["feasible"]:
+                        st.warning("No allocation meets the volatility cap; showing the lowest-risk allocation.")
+                    st.write(
+                        f"Expected return {result['expected_return'] * 100:.2f}% p.a., "
+                        f"volatility {result['volatility'] * 100:.2f}% p.a., "
+                        f"{result['evaluated']:,} allocations evaluated"
+                    )
+
         st.sidebar.markdown("### Allocate your contributions:")
         for fund in selected_funds:
-            allocation = st.sidebar.number_input(f"{fund} (%)", min_value=0, max_value=100, value=0, step=1)
+            st.session_state.setdefault(f"allocation_{fund}", 0)
+            allocation = st.sidebar.number_input(f"{fund} (%)", min_value=0, max_value=100, step=1, key=f"allocation_{fund}")
             allocations[fund] = allocation
             total_allocation += allocation
 
@@ -72,56 +211,94 @@ def main():
             st.sidebar.warning("Total allocation is less than 100%.")
 
     if selected_funds and total_allocation == 100:
-        display_fund_details(selected_funds, allocations)
-
-        # Save allocation pie chart to buffer
-        buffer_pie = BytesIO()
-        fig1, ax1 = plt.subplots(figsize=(4, 4))
-        labels = [fund for fund in selected_funds if allocations[fund] > 0]
-        sizes = [allocations[fund] for fund in selected_funds if allocations[fund] > 0]
-        ax1.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
-        ax1.axis('equal')
-        fig1.savefig(buffer_pie, format='PNG')
-        buffer_pie.seek(0)
-
-        tax_rate = 0.26
-        fund_data = fetch_fund_data(selected_funds)
-        simulation_results = perform_simulation(selected_funds, allocations, fund_data, contribution, duration, tax_rate)
+        with stage("display_fund_details"):
+            display_fund_details(selected_funds, allocations)
+
+        with stage("fetch_fund_data", funds=len(selected_funds)):
+            fund_data, fund_statistics = load_fund_data(selected_funds)
+        with stage("perform_simulation", years=duration):
+            simulation_job = run_job(
+                "perform_simulation", "simulation", cached_perform_simulation,
+                selected_funds, allocations, fund_data, contribution, duration, tax_rate, seed=42, return_distribution=True,
+                fund_statistics=fund_statistics
+            )
+        if not simulation_job.done:
+            show_job_progress(simulation_job.key, "Running Monte Carlo simulation")
+            return
+        if simulation_job.status == "failed":
+            st.error(f"Simulation failed: {simulation_job.error}")
+            return
+        simulation_results, distribution = simulation_job.result
 
         paid_in = contribution * duration * 12
         setup_cost_total = paid_in * setup_cost_rate
-        summary_df = create_summary(simulation_results, paid_in, setup_cost_total, death_benefit_option, guarantee_rate, tax_rate)
-
-        # Save bar chart to buffer
-        buffer_chart = BytesIO()
-        fig2, ax2 = plt.subplots(figsize=(6, 4))
-        ax2.bar(summary_df["Scenario"], summary_df["Guaranteed Payout (EUR)"], color=['green', 'blue', 'red'])
-        ax2.set_ylabel("Guaranteed Payout (EUR)")
-        ax2.set_title("Scenario Comparison")
-        fig2.savefig(buffer_chart, format='PNG')
-        buffer_chart.seek(0)
-
-        pdf_buffer = generate_pdf_report(
-            summary_df, advisor_name, client_name, buffer_pie, buffer_chart,
-            contribution, duration, insurance_cost_rate, setup_cost_rate, death_benefit_option, guarantee_options
-        )
+        with stage("backtest"):
+            # Eigene, längere Historie; reicht sie für die Laufzeit nicht, wird der Zeitraum gekürzt
+            backtest_data, backtest_fund_statistics = load_fund_data(selected_funds, history_years=duration + BACKTEST_START_YEARS)
+            backtest_years = min(duration, available_history_years(selected_funds, allocations, backtest_data, backtest_fund_statistics))
+            backtest = cached_rolling_window_backtest(selected_funds, allocations, backtest_data, contribution, backtest_years,
+                                                      fund_statistics=backtest_fund_statistics)
+            backtest_stats = backtest_statistics(backtest, backtest["paid_in"] * setup_cost_rate, guarantee_rate, tax_rate)
+        with stage("create_summary"):
+            summary_df = create_summary(
+                simulation_results, paid_in, setup_cost_total, death_benefit_option, guarantee_rate, tax_rate, distribution,
+                backtest_stats if backtest_years == duration else None
+            )
+
+        # Berichte werden erst beim Klick auf den Download-Button erzeugt (und dann gecacht)
+        def build_pdf_report():
+            from report_generation import render_allocation_pie, render_scenario_chart
 
-        excel_buffer = generate_excel_report(simulation_results, summary_df)
+            with stage("pdf_report") as record:
+                with stage("render_charts") as charts:
+                    buffer_pie = render_allocation_pie(selected_funds, allocations)
+                    buffer_chart = render_scenario_chart(summary_df)
+                    charts["bytes"] = buffer_size(buffer_pie) + buffer_size(buffer_chart)
+                with stage("generate_pdf_report"):
+                    pdf_buffer = cached_generate_pdf_report(
+                        summary_df, advisor_name, client_name, buffer_pie, buffer_chart,
+                        contribution, duration, insurance_cost_rate, setup_cost_rate, death_benefit_option, guarantee_options
+                    )
+                record["bytes"] = buffer_size(pdf_buffer)
+            return pdf_buffer
+
+        def build_excel_report():
+            with stage("excel_report") as record:
+                excel_buffer = cached_generate_excel_report(simulation_results, summary_df, distribution["yearly_percentiles"])
+                record["bytes"] = buffer_size(excel_buffer)
+            return excel_buffer
 
         # Anzeige der Simulation Summary als Tabelle
         st.subheader("Simulation Summary")
         st.dataframe(summary_df)
 
+        st.subheader("Capital Distribution over Time")
+        st.line_chart(distribution["yearly_percentiles"])
+
+        st.subheader("Historical Backtest")
+        if backtest_stats is None:
+            st.info("Not enough price history to backtest this investment horizon.")
+        else:
+            if backtest_years < duration:
+                st.info(f"The price history of the selected funds covers only {backtest_years} years, "
+                        f"so the backtest uses {backtest_years}-year instead of {duration}-year savings plans.")
+            st.write(
+                f"Across {backtest_stats['windows']} historical start months: final capital between "
+                f"{backtest_stats['min']:,.0f} and {backtest_stats['max']:,.0f} EUR "
+                f"(median {backtest_stats['median']:,.0f} EUR), shortfall probability against the "
+                f"contribution guarantee {backtest_stats['shortfall_probability'] * 100:.1f}%"
+            )
+
         st.download_button(
             label="Download PDF Report",
-            data=pdf_buffer,
+            data=build_pdf_report,
             file_name=f"simulation_report_{datetime.now().strftime('%Y%m%d')}.pdf",
             mime="application/pdf"
         )
 
         st.download_button(
             label="Download results as Excel",
-            data=excel_buffer,
+            data=build_excel_report,
             file_name="simulation_results.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
@@ -130,14 +307,58 @@ def main():
         time_horizon = duration
         risk_free_rate = 0.02
         volatility = 0.15
-        guarantee_levels = np.linspace(0, 1, 21)  # 0% bis 100% in 5%-Schritten
+        guarantee_levels = np.linspace(0, 1, 101)  # 0% bis 100% in 1%-Schritten
+        volatility_grid = np.arange(0.05, 0.3001, 0.005)  # 5% bis 30% in 0,5%-Schritten
+
+        with stage("guarantee_surface", levels=len(guarantee_levels), volatilities=len(volatility_grid)):
+            guarantee_surface = cached_build_guarantee_surface(
+                initial_investment, time_horizon, risk_free_rate, volatility, guarantee_levels, volatilities=volatility_grid
+            )
+        with stage("guarantee_plots") as record:
+            # Alle drei Grafiken gleichzeitig beauftragen, gezeichnet wird im Render-Thread
+            plots = [
+                render_chart_async("guarantee_vs_cost", guarantee_surface, volatility, time_horizon, risk_free_rate),
+                render_chart_async("sensitivity_volatility", guarantee_surface, time_horizon, risk_free_rate),
+                render_chart_async("sensitivity_time", guarantee_surface, volatility, risk_free_rate),
+            ]
+            st.subheader("Guarantee Cost")
+            images = [plot.result() for plot in plots]
+            for image in images:
+                st.image(image)
+            record["bytes"] = sum(len(image) for image in images)
 
-        option_prices = calculate_option_prices(initial_investment, time_horizon, risk_free_rate, volatility, guarantee_levels)
-        plot_guarantee_vs_cost(guarantee_levels, option_prices)
-        plot_sensitivity_volatility(initial_investment, time_horizon, risk_free_rate, guarantee_levels)
-        plot_sensitivity_time(initial_investment, risk_free_rate, volatility, guarantee_levels)
+        if guarantee_rate > 0:
+            # Pfadabhängige Bewertung der Beitragsgarantie inkl. Kosten, Genauigkeit 0,05% der Beiträge
+            with stage("guarantee_monte_carlo"):
+                guarantee_job = run_job(
+                    "price_contribution_guarantee", "guarantee", cached_price_contribution_guarantee,
+                    contribution, duration, guarantee_rate, risk_free_rate, volatility,
+                    insurance_cost_rate=insurance_cost_rate, setup_cost_rate=setup_cost_rate,
+                    target_se=paid_in * 0.0005, seed=42
+                )
+            st.subheader("Contribution Guarantee Cost (Monte Carlo)")
+            if not guarantee_job.done:
+                show_job_progress(
+                    guarantee_job.key, "Pricing the guarantee",
+                    lambda partial: f"{partial['price']:,.2f} EUR ± {partial['standard_error']:,.2f} EUR after {partial['n_paths']:,} paths"
+                )
+            elif guarantee_job.status == "failed":
+                st.error(f"Guarantee pricing failed: {guarantee_job.error}")
+            else:
+                guarantee_price = guarantee_job.result
+                st.write(
+                    f"{guarantee_options} guarantee: {guarantee_price['price']:,.2f} EUR "
+                    f"({guarantee_price['price_pct']:.2f}% of paid-in capital), "
+                    f"standard error {guarantee_price['standard_error']:,.2f} EUR "
+                    f"from {guarantee_price['n_paths']:,} paths"
+                )
+        else:
+            get_job_runner().release(session_id(), "guarantee")
 
     else:
+        # Laufende Jobs dieser Session werden nicht mehr gebraucht
+        get_job_runner().release(session_id(), "simulation")
+        get_job_runner().release(session_id(), "guarantee")
         st.info("Please complete all inputs in the sidebar and click 'Run Simulation'.")
 
 if __name__ == "__main__":
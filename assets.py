@@ -0,0 +1,17 @@
+import os
+from functools import lru_cache
+
+# Mitgelieferte statische Dateien (Logo, Schrift) liegen neben dem Code
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+
+@lru_cache(maxsize=None)
+def read_asset(name):
+    """
+    Liest eine mitgelieferte Datei einmal pro Prozess; alle Sessions teilen die Bytes.
+    """
+    with open(os.path.join(ASSET_DIR, name), "rb") as f:
+        return f.read()
+
+@lru_cache(maxsize=None)
+def read_text_asset(name):
+    return read_asset(name).decode("utf-8")
@@ -0,0 +1,229 @@
+"""
+Headless Massen-Quotierung von Verträgen, z.B. für den Monatsendlauf.
+
+Eingabe: CSV- oder Parquet-Datei mit einer Zeile pro Vertrag und den Spalten
+contract_id, contribution, duration sowie einer Spalte je Fonds-Ticker mit der
+Allokation in %. Optional: setup_cost_rate, death_benefit_option,
+guarantee_rate, tax_rate (fehlende Werte nehmen die Standardwerte der App an).
+
+Ausgabe: eine Zeile je Vertrag und Szenario, wird blockweise geschrieben.
+Ungültige Verträge (z.B. Allokationen ungleich 100%) werden nicht quotiert,
+sondern mit contract_id und Fehlermeldung in <output>_errors.csv aufgeführt.
+
+    python batch_quote.py portfolios.csv quotes.csv --workers 16
+"""
+import argparse
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+from fund_catalog import fetch_fund_data, funds
+from guarantee_calculation import calculate_option_prices
+from fund_statistics import get_fund_statistics
+from simulation import create_summary, perform_simulation
+
+DEFAULTS = {
+    "setup_cost_rate": 0.02,
+    "death_benefit_option": True,
+    "guarantee_rate": 0.0,
+    "tax_rate": 0.26,
+}
+RISK_FREE_RATE = 0.02
+VOLATILITY = 0.15
+
+TICKER_TO_FUND = {details["ticker"]: fund for fund, details in funds.items()}
+
+# Marktdaten und Fondskennzahlen je Worker-Prozess, einmalig über den Pool-Initializer gesetzt
+_worker_fund_data = None
+_worker_fund_statistics = None
+
+def _init_worker(fund_data):
+    global _worker_fund_data, _worker_fund_statistics
+    _worker_fund_data = fund_data
+    _worker_fund_statistics = get_fund_statistics(fund_data)
+
+def read_portfolios(path, chunk_size=500):
+    """
+    Liest die Portfolio-Datei blockweise, ohne sie vollständig zu laden.
+    """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+def parse_bool(value):
+    # CSV liefert "False"/"false"/"0" als Text, bool("False") wäre True
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)) and value in (0, 1):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in ("true", "yes", "1"):
+        return True
+    if text in ("false", "no", "0"):
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+def validate_terms(contribution, duration):
+    """
+    Prüft Beitrag und Laufzeit und liefert (Beitrag, Laufzeit in ganzen Jahren).
+    Gemeinsame Regeln für Batch-Lauf und Quotierungsdienst; ValueError bei Verstoß.
+    """
+    contribution = float(contribution)
+    duration = float(duration)
+    if not math.isfinite(contribution) or contribution <= 0:
+        raise ValueError("contribution must be positive")
+    if not duration.is_integer() or not 1 <= duration <= 40:
+        raise ValueError("duration must be a whole number of years between 1 and 40")
+    return contribution, int(duration)
+
+def quote_portfolio(row, fund_data, n_paths=10_000, seed=None, fund_statistics=None):
+    """
+    Quotiert einen Vertrag; ValueError bei ungültigen Eingaben.
+    """
+    allocations = {fund: float(row[ticker]) if ticker in row and pd.notna(row[ticker]) else 0.0
+                   for ticker, fund in TICKER_TO_FUND.items()}
+    if abs(sum(allocations.values()) - 100) > 1e-6:
+        raise ValueError(f"allocations sum to {sum(allocations.values()):g}%, expected 100%")
+    if min(allocations.values()) < 0:
+        raise ValueError("negative allocation")
+    selected_funds = [fund for fund, allocation in allocations.items() if allocation > 0]
+
+    contribution, duration = validate_terms(row["contribution"], row["duration"])
+    options = {key: row[key] if key in row and pd.notna(row[key]) else default for key, default in DEFAULTS.items()}
+    options["death_benefit_option"] = parse_bool(options["death_benefit_option"])
+
+    simulation_results, distribution = perform_simulation(
+        selected_funds, allocations, fund_data, contribution, duration, options["tax_rate"],
+        n_paths=n_paths, seed=seed, return_distribution=True, fund_statistics=fund_statistics
+    )
+
+    paid_in = contribution * duration * 12
+    setup_cost_total = paid_in * options["setup_cost_rate"]
+    summary_df = create_summary(
+        simulation_results, paid_in, setup_cost_total, options["death_benefit_option"],
+        options["guarantee_rate"], options["tax_rate"], distribution
+    )
+    guarantee_cost = calculate_option_prices(paid_in, duration, RISK_FREE_RATE, VOLATILITY, [options["guarantee_rate"]])[0]
+    summary_df.insert(0, "contract_id", row["contract_id"])
+    summary_df["Guarantee Cost (%)"] = guarantee_cost
+    return summary_df
+
+def _quote_chunk(chunk, n_paths, seed):
+    results = []
+    errors = []
+    for position, (_, row) in enumerate(chunk.iterrows()):
+        # Seed je Vertrag -> Ergebnis unabhängig von Blockgröße und Worker-Anzahl
+        contract_seed = None if seed is None else [seed, int(chunk.index[position])]
+        try:
+            results.append(quote_portfolio(row, _worker_fund_data, n_paths=n_paths, seed=contract_seed,
+                                           fund_statistics=_worker_fund_statistics))
+        except (KeyError, TypeError, ValueError) as exc:
+            errors.append({"contract_id": row.get("contract_id"), "error": str(exc)})
+    return (len(results), pd.concat(results, ignore_index=True) if results else pd.DataFrame(),
+            pd.DataFrame(errors, columns=["contract_id", "error"]))
+
+class _ResultWriter:
+    def __init__(self, path):
+        self.path = path
+        self.parquet_writer = None
+        self.header_written = False
+
+    def write(self, df):
+        if df.empty:
+            return
+        if self.path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self.parquet_writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode="a" if self.header_written else "w", header=not self.header_written, index=False)
+            self.header_written = True
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+def quote_portfolios(input_path, output_path, n_paths=10_000, max_workers=None, chunk_size=50, seed=0, fund_data=None):
+    """
+    Quotiert alle Verträge aus input_path und schreibt die Ergebnisse laufend
+    nach output_path. Die Marktdaten werden einmal geladen und an jeden Worker
+    übergeben; höchstens 2 Blöcke pro Worker sind gleichzeitig in Arbeit.
+    Ungültige Verträge landen in <output>_errors.csv. Liefert die Anzahl
+    quotierter und abgelehnter Verträge.
+    """
+    if fund_data is None:
+        fund_data = fetch_fund_data(list(funds))
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = 2 * max_workers
+
+    errors_path = os.path.splitext(output_path)[0] + "_errors.csv"
+    # Vorherige Teilergebnisse nicht weiterführen
+    for path in (output_path, errors_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    writer = _ResultWriter(output_path)
+    error_writer = _ResultWriter(errors_path)
+    n_quoted = 0
+    n_failed = 0
+    in_flight = set()
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(fund_data,)) as executor:
+            offset = 0
+            for chunk in read_portfolios(input_path, chunk_size):
+                chunk.index = np.arange(offset, offset + len(chunk))
+                offset += len(chunk)
+                in_flight.add(executor.submit(_quote_chunk, chunk, n_paths, seed))
+
+                if len(in_flight) >= max_in_flight:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        n_chunk, result, errors = future.result()
+                        writer.write(result)
+                        error_writer.write(errors)
+                        n_quoted += n_chunk
+                        n_failed += len(errors)
+
+            for future in wait(in_flight).done:
+                n_chunk, result, errors = future.result()
+                writer.write(result)
+                error_writer.write(errors)
+                n_quoted += n_chunk
+                n_failed += len(errors)
+    finally:
+        writer.close()
+        error_writer.close()
+
+    return n_quoted, n_failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch quoting of unit-linked contracts")
+    parser.add_argument("input", help="CSV or Parquet file with one portfolio per row")
+    parser.add_argument("output", help="CSV or Parquet file for the quote results")
+    parser.add_argument("--paths", type=int, default=10_000, help="Monte Carlo paths per contract")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=50, help="contracts per worker task")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    n_quoted, n_failed = quote_portfolios(args.input, args.output, n_paths=args.paths, max_workers=args.workers,
+                                          chunk_size=args.chunk_size, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"Quoted {n_quoted} contracts in {elapsed:.1f}s ({n_quoted / elapsed * 3600:,.0f} per hour)")
+    if n_failed:
+        print(f"Rejected {n_failed} contracts, see {os.path.splitext(args.output)[0]}_errors.csv")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Offline-Benchmarks der Pipeline-Stufen auf deterministischen synthetischen Kursdaten.
+
+Misst je Stufe und Parameterkombination die Laufzeit (Minimum über --repeat
+Läufe) und den Spitzen-Speicher (tracemalloc) und vergleicht mit einer
+gespeicherten Baseline:
+
+    python benchmark.py --update-baseline      # Baseline auf dieser Maschine anlegen
+    python benchmark.py --threshold 0.25       # Exit-Code 1 bei >25% Verschlechterung
+
+Ohne Baseline-Datei endet der Vergleich mit Exit-Code 2. benchmark_baseline.json
+im Repository ist auf einem Einzelkern-Rechner entstanden; für aussagekräftige
+Vergleiche auf anderer Hardware zuerst lokal --update-baseline ausführen.
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from functools import lru_cache
+from itertools import count
+
+import numpy as np
+from fund_catalog import synthetic_fund_data
+
+HORIZONS = [1, 10, 20, 40]
+FUND_COUNTS = [1, 3, 5]
+GUARANTEE_GRID_SIZES = [21, 101, 1001]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+def equal_allocations(selected_funds):
+    base, remainder = divmod(100, len(selected_funds))
+    return {fund: base + (1 if idx < remainder else 0) for idx, fund in enumerate(selected_funds)}
+
+def measure(func, repeat):
+    """
+    Laufzeit als Minimum über repeat Läufe nach einem ungemessenen Aufwärmlauf
+    (Lazy-Imports, Caches beim ersten Aufruf), Spitzen-Speicher aus einem
+    separaten Lauf unter tracemalloc (damit dessen Overhead die Zeit nicht verfälscht).
+    """
+    func()
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(timings), "peak_mb": peak / 2 ** 20}
+
+def benchmark_cases(work_dir):
+    """
+    Liefert (Name, Setup) für jede Stufe und Parameterkombination. Setup()
+    bereitet die Eingaben vor und liefert die zu messende Funktion; es wird
+    nur für ausgewählte Fälle aufgerufen. Dateien landen unter work_dir.
+    """
+    from charts import _render
+    from fund_statistics import get_fund_statistics
+    from guarantee_calculation import build_guarantee_surface, calculate_option_prices
+    from investment_simulation import simulate_investment
+    from market_data import LocalFileProvider, MarketDataStore
+    from report_generation import generate_excel_report, generate_pdf_report, render_allocation_pie, render_scenario_chart
+    from simulation import create_summary, perform_simulation
+
+    cases = []
+    tax_rate = 0.26
+    chart_cache = _render.cache
+
+    # Gemeinsame Eingaben werden beim ersten Bedarf erzeugt und dann wiederverwendet
+    @lru_cache(maxsize=None)
+    def portfolio(n_funds):
+        fund_data = synthetic_fund_data(n_funds)
+        selected_funds = list(fund_data)
+        # Wie in der App einmal pro Datenstand vorberechnet
+        return fund_data, selected_funds, equal_allocations(selected_funds), get_fund_statistics(fund_data)
+
+    @lru_cache(maxsize=None)
+    def report_inputs(n_funds, years):
+        fund_data, selected_funds, allocations, _ = portfolio(n_funds)
+        simulation_results, distribution = perform_simulation(selected_funds, allocations, fund_data, 100, years, tax_rate,
+                                                              seed=0, return_distribution=True)
+        paid_in = 100 * years * 12
+        summary_df = create_summary(simulation_results, paid_in, paid_in * 0.02, True, 0.5, tax_rate, distribution)
+        return selected_funds, allocations, simulation_results, distribution, summary_df
+
+    for n_funds in FUND_COUNTS:
+        for years in HORIZONS:
+            params = f"years={years},funds={n_funds}"
+
+            def simulation_case(n=n_funds, y=years):
+                fund_data, selected_funds, allocations, _ = portfolio(n)
+                return lambda: perform_simulation(selected_funds, allocations, fund_data, 100, y, tax_rate, seed=0)
+
+            def deterministic_case(n=n_funds, y=years):
+                fund_data, selected_funds, allocations, _ = portfolio(n)
+                return lambda: perform_simulation(selected_funds, allocations, fund_data, 100, y, tax_rate, method="deterministic")
+
+            def replay_case(n=n_funds, y=years):
+                fund_data, selected_funds, allocations, fund_statistics = portfolio(n)
+                return lambda: simulate_investment("2000-01-01", f"{1999 + y}-12-31", 100, selected_funds, allocations, fund_data,
+                                                   fund_statistics=fund_statistics)
+
+            cases.append((f"perform_simulation[{params}]", simulation_case))
+            cases.append((f"perform_simulation_deterministic[{params}]", deterministic_case))
+            cases.append((f"simulate_investment[{params}]", replay_case))
+
+    for grid_size in GUARANTEE_GRID_SIZES:
+        for years in HORIZONS:
+            params = f"years={years},levels={grid_size}"
+
+            def option_prices_case(g=grid_size, y=years):
+                levels = np.linspace(0, 1, g)
+                return lambda: calculate_option_prices(100 * y * 12, y, 0.02, 0.15, levels)
+
+            def surface_case(g=grid_size, y=years):
+                levels = np.linspace(0, 1, g)
+                return lambda: build_guarantee_surface(100 * y * 12, y, 0.02, 0.15, levels, volatilities=np.arange(0.05, 0.3001, 0.005))
+
+            cases.append((f"calculate_option_prices[{params}]", option_prices_case))
+            cases.append((f"build_guarantee_surface[{params}]", surface_case))
+
+    for n_funds in (1, 5):
+        for years in (1, 40):
+            params = f"years={years},funds={n_funds}"
+
+            def charts_case(n=n_funds, y=years):
+                selected_funds, allocations, _, _, summary_df = report_inputs(n, y)
+                # Diagramm-Cache leeren, damit tatsächlich gezeichnet wird
+                return lambda: (chart_cache.clear(), render_allocation_pie(selected_funds, allocations), render_scenario_chart(summary_df))
+
+            def pdf_case(n=n_funds, y=years):
+                selected_funds, allocations, _, _, summary_df = report_inputs(n, y)
+                buffer_pie = render_allocation_pie(selected_funds, allocations)
+                buffer_chart = render_scenario_chart(summary_df)
+                # Wechselnde Namen wie bei Serienbriefen: jeder Bericht braucht andere Glyphen
+                clients = (f"Client {i} {chr(0xC0 + i % 64)}" for i in count())
+                return lambda: generate_pdf_report(summary_df, "Advisor", next(clients), buffer_pie, buffer_chart, 100, y, 0.01, 0.02, True, "50%")
+
+            def excel_case(n=n_funds, y=years):
+                _, _, simulation_results, distribution, summary_df = report_inputs(n, y)
+                return lambda: generate_excel_report(simulation_results, summary_df, distribution["yearly_percentiles"])
+
+            cases.append((f"render_charts[{params}]", charts_case))
+            cases.append((f"generate_pdf_report[{params}]", pdf_case))
+            cases.append((f"generate_excel_report[{params}]", excel_case))
+
+    def store_case():
+        # Kurse aus dem lokalen Store (warmer Cache, ohne Netzwerk)
+        source_dir = os.path.join(work_dir, "source")
+        os.makedirs(source_dir, exist_ok=True)
+        fund_data = synthetic_fund_data(5)
+        for data in fund_data.values():
+            ticker = data.columns.get_level_values("Ticker")[0]
+            data["Close"].rename(columns={ticker: "Close"}).to_csv(os.path.join(source_dir, f"{ticker}.csv"))
+        store = MarketDataStore(os.path.join(work_dir, "cache"), provider=LocalFileProvider(source_dir),
+                                ttl=timedelta(days=365 * 100), history_years=100)
+        tickers = [data.columns.get_level_values("Ticker")[0] for data in fund_data.values()]
+        store.get(tickers)
+        return lambda: store.get(tickers)
+
+    def cold_import_case():
+        # Kaltstart: Import der App in einem frischen Interpreter
+        repo_dir = os.path.dirname(os.path.abspath(__file__))
+        return lambda: subprocess.run([sys.executable, "-c", "import app"], cwd=repo_dir, check=True, capture_output=True)
+
+    cases.append(("market_data_store_get[funds=5]", store_case))
+    cases.append(("app_cold_import", cold_import_case))
+    return cases
+
+def compare(results, baseline, threshold, min_delta_seconds=0.002):
+    """
+    Liefert die Liste der Stufen, deren Zeit oder Speicher mehr als threshold
+    (relativ) über der Baseline liegt. Zeiten müssen zusätzlich um mindestens
+    min_delta_seconds steigen, sonst schlägt das Messrauschen im
+    Millisekundenbereich durch.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric in ("seconds", "peak_mb"):
+            slack = min_delta_seconds if metric == "seconds" else 0.0
+            if reference[metric] > 0 and result[metric] > max(reference[metric] * (1 + threshold), reference[metric] + slack):
+                regressions.append((name, metric, reference[metric], result[metric]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the VitaVerde pipeline stages")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression (default 0.25)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore slowdowns smaller than this (default 2 ms)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="vitaverde_bench_") as work_dir:
+        for name, setup in benchmark_cases(work_dir):
+            if args.filter not in name:
+                continue
+            results[name] = measure(setup(), args.repeat)
+            print(f"{name:70s} {results[name]['seconds'] * 1000:10.2f} ms {results[name]['peak_mb']:10.2f} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        # Ohne Baseline kann keine Regression erkannt werden -> Prüfung gilt als fehlgeschlagen
+        print(f"No baseline at {args.baseline}; run with --update-baseline first")
+        return 2
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms / 1000)
+    for name, metric, reference, value in regressions:
+        print(f"REGRESSION {name} {metric}: {reference:.4f} -> {value:.4f} ({value / reference - 1:+.0%})")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Massenerzeugung personalisierter PDF-Berichte, z.B. für Jahresmitteilungen.
+
+Jeder Datensatz ist ein dict mit summary_df, client_name, advisor_name,
+selected_funds, allocations, contribution, duration, insurance_cost_rate,
+setup_cost_rate, death_benefit_option, guarantee_options und optional
+file_name. Die Berichte werden in Worker-Prozessen erzeugt und in ein
+Verzeichnis oder eine .zip-Datei geschrieben, sobald sie fertig sind.
+"""
+import os
+import re
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from report_generation import generate_pdf_report, get_pdf_template, render_allocation_pie, render_scenario_chart
+
+def _init_worker():
+    # Schriften einmal pro Worker registrieren, alle Dokumente kopieren die Vorlage
+    get_pdf_template()
+
+def _report_file_name(record, number):
+    if record.get("file_name"):
+        return record["file_name"]
+    client = re.sub(r"[^\w\-]+", "_", str(record.get("client_name", "client"))).strip("_") or "client"
+    return f"{number:06d}_{client}.pdf"
+
+def render_report(record, number=0):
+    buffer_pie = render_allocation_pie(record["selected_funds"], record["allocations"])
+    buffer_chart = render_scenario_chart(record["summary_df"])
+    pdf_buffer = generate_pdf_report(
+        record["summary_df"], record["advisor_name"], record["client_name"], buffer_pie, buffer_chart,
+        record["contribution"], record["duration"], record["insurance_cost_rate"], record["setup_cost_rate"],
+        record["death_benefit_option"], record["guarantee_options"]
+    )
+    return _report_file_name(record, number), pdf_buffer.getvalue()
+
+def _render_numbered(numbered_record):
+    number, record = numbered_record
+    return render_report(record, number)
+
+class _ReportSink:
+    def __init__(self, output):
+        self.output = output
+        if output.endswith(".zip"):
+            self.archive = zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            self.archive = None
+            os.makedirs(output, exist_ok=True)
+
+    def write(self, file_name, content):
+        if self.archive is not None:
+            self.archive.writestr(file_name, content)
+        else:
+            with open(os.path.join(self.output, file_name), "wb") as f:
+                f.write(content)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+def generate_bulk_reports(records, output, max_workers=None, max_in_flight_per_worker=4):
+    """
+    Erzeugt einen PDF-Bericht pro Datensatz. records darf ein Generator sein;
+    es sind höchstens max_in_flight_per_worker Berichte pro Worker gleichzeitig
+    in Arbeit, der Speicherbedarf bleibt damit unabhängig von der Anzahl.
+    Liefert die Anzahl geschriebener Berichte.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight_per_worker * max_workers
+
+    sink = _ReportSink(output)
+    n_written = 0
+    in_flight = set()
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+            for number, record in enumerate(records):
+                in_flight.add(executor.submit(_render_numbered, (number, record)))
+
+                if len(in_flight) >= max_in_flight:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        sink.write(*future.result())
+                        n_written += 1
+
+            for future in wait(in_flight).done:
+                sink.write(*future.result())
+                n_written += 1
+    finally:
+        sink.close()
+
+    return n_written
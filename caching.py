@@ -0,0 +1,127 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+def _normalize(value):
+    """
+    Wandelt Argumente in eine stabile, hashbare Darstellung um. DataFrames,
+    Arrays und Buffer werden über ihren Inhalt gehasht.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        content = pd.util.hash_pandas_object(value, index=True).to_numpy()
+        columns = tuple(map(str, value.columns)) if isinstance(value, pd.DataFrame) else value.name
+        return ("pandas", columns, hashlib.sha1(content.tobytes()).hexdigest())
+    if isinstance(value, np.ndarray):
+        return ("ndarray", value.dtype.str, value.shape, hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest())
+    if isinstance(value, BytesIO):
+        return ("bytes", hashlib.sha1(value.getvalue()).hexdigest())
+    if isinstance(value, dict):
+        return ("dict", tuple(sorted((str(k), _normalize(v)) for k, v in value.items())))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, tuple(_normalize(v) for v in value))
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def make_key(*args, **kwargs):
+    normalized = (_normalize(args), _normalize(kwargs))
+    return hashlib.sha1(repr(normalized).encode()).hexdigest()
+
+class LRUCache:
+    """
+    Größenbeschränkter LRU-Cache mit optionaler Ablaufzeit und Trefferstatistik.
+    Thread-sicher, da Streamlit-Sessions in Threads desselben Prozesses laufen.
+    """
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[1] <= self.ttl):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+# Prozessweite Caches je Pipeline-Stufe, von allen Sessions geteilt
+_caches = {}
+# Callbacks (stage, found) nach jedem Cache-Zugriff, z.B. für Metriken
+_lookup_listeners = []
+
+def add_lookup_listener(listener):
+    _lookup_listeners.append(listener)
+
+def memoize(stage, maxsize=128, ttl=None, copy=None, ignore=()):
+    """
+    Decorator: cached das Ergebnis einer Pipeline-Stufe anhand ihrer Argumente.
+    Gecachte Objekte werden zwischen Sessions geteilt und dürfen daher nicht
+    verändert werden; copy erzeugt bei Bedarf eine Kopie pro Aufruf (z.B. für
+    BytesIO, dessen Leseposition sonst geteilt würde). Keyword-Argumente in
+    ignore (z.B. Fortschritts-Callbacks) gehen nicht in den Schlüssel ein.
+    """
+    cache = _caches.setdefault(stage, LRUCache(maxsize, ttl))
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(*args, **{name: value for name, value in kwargs.items() if name not in ignore})
+            found, value = cache.get(key)
+            for listener in _lookup_listeners:
+                listener(stage, found)
+            if not found:
+                value = func(*args, **kwargs)
+                cache.put(key, value)
+            return copy(value) if copy is not None else value
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+def copy_buffer(buffer):
+    return BytesIO(buffer.getvalue())
+
+def cache_stats():
+    return pd.DataFrame.from_dict({stage: cache.stats() for stage, cache in _caches.items()}, orient="index")
+
+def clear_caches():
+    for cache in _caches.values():
+        cache.clear()
@@ -0,0 +1,71 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from caching import memoize
+from guarantee_calculation import plot_guarantee_vs_cost, plot_sensitivity_time, plot_sensitivity_volatility
+
+def draw_allocation_pie(fig, selected_funds, allocations):
+    ax = fig.subplots()
+    labels = [fund for fund in selected_funds if allocations[fund] > 0]
+    sizes = [allocations[fund] for fund in selected_funds if allocations[fund] > 0]
+    ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
+    ax.axis('equal')
+
+def draw_scenario_chart(fig, summary_df):
+    ax = fig.subplots()
+    ax.bar(summary_df["Scenario"], summary_df["Guaranteed Payout (EUR)"], color=['green', 'blue', 'red'])
+    ax.set_ylabel("Guaranteed Payout (EUR)")
+    ax.set_title("Scenario Comparison")
+
+# Diagrammart -> (Zeichenfunktion, Größe in Zoll)
+CHARTS = {
+    "allocation_pie": (draw_allocation_pie, (4, 4)),
+    "scenario_chart": (draw_scenario_chart, (6, 4)),
+    "guarantee_vs_cost": (plot_guarantee_vs_cost, (10, 6)),
+    "sensitivity_volatility": (plot_sensitivity_volatility, (10, 6)),
+    "sensitivity_time": (plot_sensitivity_time, (10, 6)),
+}
+
+@memoize("charts", maxsize=256)
+def _render(kind, fmt, args, kwargs):
+    # Figure mit Agg-Canvas ohne pyplot: nicht im globalen Figure-Manager registriert
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    draw, figsize = CHARTS[kind]
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    try:
+        draw(fig, *args, **kwargs)
+        buffer = BytesIO()
+        fig.savefig(buffer, format=fmt)
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+# Ein Render-Thread pro Prozess: matplotlib ist nicht thread-sicher, und der Script-Thread
+# wartet nicht aufs Zeichnen. Nach einem fork (Worker-Prozesse) wird er neu angelegt.
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vitaverde-charts")
+            _executor_pid = os.getpid()
+        return _executor
+
+def render_chart_async(kind, *args, fmt="png", **kwargs):
+    """
+    Zeichnet das Diagramm im Render-Thread und liefert ein Future mit den
+    Bildbytes. Jede Kombination aus Art, Format und Eingaben wird nur einmal
+    gezeichnet; UI und PDF-Bericht teilen sich die gecachten Bytes.
+    """
+    return _get_executor().submit(_render, kind, fmt, args, kwargs)
+
+def render_chart(kind, *args, fmt="png", **kwargs):
+    return render_chart_async(kind, *args, fmt=fmt, **kwargs).result()
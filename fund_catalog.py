@@ -0,0 +1,60 @@
+# fund_catalog.py
+# Fondsuniversum und Kursabruf ohne Streamlit, für App und Headless-Werkzeuge
+import numpy as np
+import pandas as pd
+from market_data import get_default_store
+
+funds = {
+    "iShares MSCI World ETF": {
+        "ticker": "URTH",
+        "type": "Equity",
+        "description": "Global developed markets equity exposure."
+    },
+    "SPDR S&P 500 ETF Trust": {
+        "ticker": "SPY",
+        "type": "Equity",
+        "description": "Large-cap US equity exposure."
+    },
+    "iShares Euro Govt Bond 10-25yr UCITS ETF": {
+        "ticker": "IEGA.DE",
+        "type": "Bond",
+        "description": "Eurozone government bonds with 10-25 years maturity."
+    },
+    "Vanguard FTSE All-World UCITS ETF": {
+        "ticker": "VWRD.L",
+        "type": "Equity",
+        "description": "Global diversified equity exposure."
+    },
+    "Xtrackers MSCI Emerging Markets UCITS ETF": {
+        "ticker": "XMME.DE",
+        "type": "Equity",
+        "description": "Emerging markets equity exposure."
+    },
+}
+
+def fetch_fund_data(selected_funds, store=None, history_years=None):
+    store = store or get_default_store()
+    prices = store.get([funds[fund]["ticker"] for fund in selected_funds], history_years=history_years)
+    return {fund: prices[funds[fund]["ticker"]] for fund in selected_funds}
+
+def synthetic_fund_data(n_funds, months=60, seed=0, end="2024-12-01"):
+    """
+    Deterministische Monatskurse der ersten n_funds Fonds aus funds,
+    im Format von yf.download(ticker, period="5y", interval="1mo"): Spalten als
+    MultiIndex (Price, Ticker) mit Adj Close, Close, High, Low, Open, Volume.
+    Stand-in für Marktdaten in Benchmarks und im Quotierungsdienst ohne Netzwerk.
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(end=end, periods=months, freq="MS", name="Date")
+    fund_data = {}
+    for fund, details in list(funds.items())[:n_funds]:
+        drift, vol = (0.002, 0.015) if details["type"] == "Bond" else (0.007, 0.045)
+        close = 100 * np.cumprod(1 + rng.normal(drift, vol, months))
+        high = close * (1 + np.abs(rng.normal(0, 0.02, months)))
+        low = close * (1 - np.abs(rng.normal(0, 0.02, months)))
+        columns = pd.MultiIndex.from_product(
+            [["Adj Close", "Close", "High", "Low", "Open", "Volume"], [details["ticker"]]], names=["Price", "Ticker"]
+        )
+        values = np.column_stack([close, close, high, low, np.roll(close, 1), rng.integers(1e5, 1e7, months)])
+        fund_data[fund] = pd.DataFrame(values, index=index, columns=columns)
+    return fund_data
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from caching import make_key, memoize
+from utils import get_close_prices
+
+class FundStatistics:
+    """
+    Renditekennzahlen aller Fonds eines Marktdatenstands, einmal berechnet:
+    Mittelwert und Volatilität der einfachen Monatsrenditen (wie
+    calculate_expected_returns), Momente der Log-Renditen und die
+    Kovarianzmatrix. Abfragen sind danach reine Dictionary-/Index-Zugriffe.
+
+    Gedacht für das ganze Fondsuniversum (fund_catalog.funds): Kennzahlen und
+    die paarweise Kovarianz einer Auswahl ergeben sich durch Indexieren, ohne
+    für jede Fondsauswahl neu zu rechnen.
+    """
+    def __init__(self, fund_data):
+        # Inhalts-Fingerprint: als Argument gecachter Stufen stabil über Objekte hinweg
+        self.key = make_key(fund_data)
+        closes = {fund: get_close_prices(data) for fund, data in fund_data.items() if not data.empty}
+        self.funds = list(closes)
+        self._position = {fund: idx for idx, fund in enumerate(self.funds)}
+
+        self.moments = {}
+        self.monthly_returns = {}
+        for fund, close in closes.items():
+            returns = close.pct_change().dropna()
+
+            # Lückenlose Monatsreihe (fehlende Monate mit 0% Rendite) für die historische Wiedergabe
+            months = returns.index.values.astype("datetime64[M]")
+            calendar = np.arange(months[0], months[-1] + 1) if len(months) else months
+            replay = np.zeros(len(calendar))
+            replay[(months - calendar[:1]).astype(int)] = returns.to_numpy(dtype=float)
+            self.monthly_returns[fund] = (calendar, replay)
+
+            log_returns = np.log(close).diff().dropna()
+            self.moments[fund] = {
+                "mean": float(returns.mean()),
+                "volatility": float(returns.std()),
+                "log_mean": float(log_returns.mean()),
+                "log_volatility": float(log_returns.std()),
+                "log_skew": float(log_returns.skew()),
+                "log_kurtosis": float(log_returns.kurt()),
+                "observations": len(returns),
+            }
+
+        if closes:
+            # Paarweise über die gemeinsamen Monate je Fondspaar
+            joint_returns = pd.concat(closes, axis=1).pct_change()
+            self.covariance_matrix = joint_returns.cov().to_numpy()
+        else:
+            self.covariance_matrix = np.empty((0, 0))
+        self.mean_vector = np.array([self.moments[fund]["mean"] for fund in self.funds])
+
+    def __repr__(self):
+        return f"FundStatistics({self.key})"
+
+    def __contains__(self, fund):
+        return fund in self._position
+
+    def expected_returns(self, fund):
+        moments = self.moments[fund]
+        return moments["mean"], moments["volatility"]
+
+    def mean(self, funds):
+        return self.mean_vector[[self._position[fund] for fund in funds]]
+
+    def covariance(self, funds):
+        idx = [self._position[fund] for fund in funds]
+        return self.covariance_matrix[np.ix_(idx, idx)]
+
+    def to_frame(self):
+        return pd.DataFrame.from_dict(self.moments, orient="index")
+
+# Je Marktdatenstand (Inhalts-Hash der Kursdaten) nur einmal berechnen;
+# ein Refresh des Stores ändert die Kurse und damit automatisch den Schlüssel
+@memoize("fund_statistics", maxsize=16)
+def get_fund_statistics(fund_data):
+    return FundStatistics(fund_data)
@@ -1,6 +1,7 @@
 import numpy as np
-from scipy.stats import norm
-import matplotlib.pyplot as plt
+
+# scipy wird erst bei der ersten Bewertung in black_scholes_put_greeks importiert (schnellerer App-Start);
+# alle anderen Bewertungen laufen darüber, einmal pro Array statt pro Einzelpreis
 
 def black_scholes_put(S, K, T, r, sigma):
     """
@@ -8,55 +9,204 @@ def black_scholes_put(S, K, T, r, sigma):
     """
     if S <= 0 or K <= 0 or T <= 0 or sigma <= 0:
         return 0.0
+    # Skalarer Aufruf der vektorisierten Formel, scipy wird nur dort geladen
+    return float(black_scholes_put_greeks(S, K, T, r, sigma)["price"])
+
+SENSITIVITY_VOLATILITIES = [0.10, 0.15, 0.20, 0.25]
+SENSITIVITY_TERMS = [10, 20, 30, 40]
+
+def black_scholes_put_greeks(S, K, T, r, sigma):
+    """
+    Vektorisierte Variante von black_scholes_put: alle Argumente werden
+    gegeneinander gebroadcastet. Liefert Preis, Delta, Vega und Rho als Arrays;
+    ungültige Kombinationen (S, K, T oder sigma <= 0) ergeben überall 0.
+    """
+    from scipy.special import ndtr
 
-    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    put_price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
+    S, K, T, r, sigma = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (S, K, T, r, sigma)))
+    valid = (S > 0) & (K > 0) & (T > 0) & (sigma > 0)
 
-    return put_price
+    # Ungültige Stellen mit 1 belegen, damit log/Division keine Warnungen erzeugen
+    S, K, T, sigma = (np.where(valid, x, 1.0) for x in (S, K, T, sigma))
+    sqrt_T = np.sqrt(T)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+    discounted_strike = K * np.exp(-r * T)
+    n_minus_d2 = ndtr(-d2)
+
+    greeks = {
+        "price": discounted_strike * n_minus_d2 - S * ndtr(-d1),
+        "delta": ndtr(d1) - 1,
+        "vega": S * np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi) * sqrt_T,
+        "rho": -T * discounted_strike * n_minus_d2,
+    }
+    return {name: np.where(valid, value, 0.0) for name, value in greeks.items()}
+
+def price_guarantee_surface(initial_investment, guarantee_levels, volatilities, terms, rates):
+    """
+    Bewertet das Gitter Garantieniveau x Volatilität x Laufzeit x Zins in einem Aufruf.
+    Preis, Vega und Rho werden in % der Investition angegeben, Delta unverändert.
+    """
+    levels = np.asarray(guarantee_levels, dtype=float)
+    volatilities = np.asarray(volatilities, dtype=float)
+    terms = np.asarray(terms, dtype=float)
+    rates = np.asarray(rates, dtype=float)
+
+    greeks = black_scholes_put_greeks(
+        initial_investment,
+        initial_investment * levels[:, None, None, None],
+        terms[None, None, :, None],
+        rates[None, None, None, :],
+        volatilities[None, :, None, None],
+    )
+    surface = {name: value / initial_investment * 100 for name, value in greeks.items() if name != "delta"}
+    surface["delta"] = greeks["delta"]
+    surface.update(guarantee_levels=levels, volatilities=volatilities, terms=terms, rates=rates)
+    return surface
+
+def build_guarantee_surface(initial_investment, time_horizon, risk_free_rate, volatility, guarantee_levels,
+                            volatilities=None, terms=None):
+    # Gitter enthält immer die Basiswerte, damit alle Plots aus derselben Fläche lesen können
+    if volatilities is None:
+        volatilities = SENSITIVITY_VOLATILITIES
+    if terms is None:
+        terms = SENSITIVITY_TERMS
+    volatilities = np.unique(np.round(np.append(volatilities, volatility), 6))
+    terms = np.unique(np.append(terms, time_horizon))
+    return price_guarantee_surface(initial_investment, guarantee_levels, volatilities, terms, [risk_free_rate])
+
+def surface_slice(surface, volatility, term, rate, value="price"):
+    # Nächstgelegener Gitterpunkt je Achse, Ergebnis über alle Garantieniveaus
+    vol_idx = np.abs(surface["volatilities"] - volatility).argmin()
+    term_idx = np.abs(surface["terms"] - term).argmin()
+    rate_idx = np.abs(surface["rates"] - rate).argmin()
+    return surface[value][:, vol_idx, term_idx, rate_idx]
 
 def calculate_option_prices(initial_investment, time_horizon, risk_free_rate, volatility, guarantee_levels):
-    option_prices = []
-    for level in guarantee_levels:
-        if level == 0.0:
-            option_price = 0.0
-        else:
-            strike = initial_investment * level
-            option_price = black_scholes_put(initial_investment, strike, time_horizon, risk_free_rate, volatility)
-        option_prices.append(option_price / initial_investment * 100)  # als Prozentsatz
-    return option_prices
-
-def plot_guarantee_vs_cost(guarantee_levels, option_prices):
-    plt.figure(figsize=(10, 6))
-    plt.plot(guarantee_levels * 100, option_prices, marker='o')
-    plt.title('Kosten der Garantie in Abhängigkeit vom Garantieniveau')
-    plt.xlabel('Garantieniveau (%)')
-    plt.ylabel('Optionskosten (% der Investition)')
-    plt.grid(True)
-    plt.show()
-
-def plot_sensitivity_volatility(initial_investment, time_horizon, risk_free_rate, guarantee_levels):
-    vols = [0.10, 0.15, 0.20, 0.25]
-    plt.figure(figsize=(10, 6))
+    levels = np.asarray(guarantee_levels, dtype=float)
+    put_prices = black_scholes_put_greeks(initial_investment, initial_investment * levels, time_horizon, risk_free_rate, volatility)["price"]
+    return list(put_prices / initial_investment * 100)  # als Prozentsatz
+
+def _solve_increasing(func, target, lower, upper, tol=1e-9, max_iter=100):
+    """
+    Newton-Verfahren mit Intervallschachtelung für steigende Funktionen, elementweise
+    über Arrays. func(x) liefert (Wert, Ableitung); verlässt der Newton-Schritt das
+    aktuelle Intervall oder ist die Ableitung 0, wird stattdessen halbiert.
+    Das Ziel muss zwischen func(lower) und func(upper) liegen.
+    """
+    target, lower, upper = (np.array(x, dtype=float) for x in np.broadcast_arrays(target, lower, upper))
+    x = 0.5 * (lower + upper)
+    for _ in range(max_iter):
+        value, slope = func(x)
+        error = value - target
+        if np.all((np.abs(error) <= tol) | (upper - lower <= tol * 1e-3)):
+            break
+        above = error > 0
+        upper = np.where(above, x, upper)
+        lower = np.where(above, lower, x)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            newton = x - error / slope
+        inside = np.isfinite(newton) & (newton > lower) & (newton < upper)
+        x = np.where(inside, newton, 0.5 * (lower + upper))
+    return x
+
+def solve_guarantee_level(budget_pct, time_horizon, risk_free_rate, volatility, max_level=1.0):
+    """
+    Höchstes Garantieniveau, dessen Put-Preis (in % der Investition, wie in
+    calculate_option_prices) das Budget nicht übersteigt. Alle Argumente werden
+    gegeneinander gebroadcastet. Budgets über den Kosten von max_level ergeben max_level.
+    """
+    budget, T, r, sigma, max_level = (np.asarray(x, dtype=float) for x in
+                                      np.broadcast_arrays(budget_pct, time_horizon, risk_free_rate, volatility, max_level))
+
+    def cost(level):
+        greeks = black_scholes_put_greeks(1.0, level, T, r, sigma)
+        # dP/dK = exp(-rT) N(-d2) = -rho / (T K)
+        denominator = T * level
+        slope = np.where(denominator > 0, -greeks["rho"] / np.where(denominator > 0, denominator, 1.0), 0.0)
+        return greeks["price"] * 100, slope * 100
+
+    max_cost, _ = cost(max_level)
+    level = _solve_increasing(cost, np.clip(budget, 0, max_cost), 0.0, max_level)
+    return np.where(budget >= max_cost, max_level, np.where(budget <= 0, 0.0, level))
+
+def implied_volatility(price_pct, guarantee_level, time_horizon, risk_free_rate, lower=1e-4, upper=5.0):
+    """
+    Volatilität, bei der der Put auf das Garantieniveau den angegebenen Preis
+    (in % der Investition) hat. Preise außerhalb der bei lower..upper
+    erreichbaren Spanne ergeben NaN.
+    """
+    price, level, T, r = (np.asarray(x, dtype=float) for x in
+                          np.broadcast_arrays(price_pct, guarantee_level, time_horizon, risk_free_rate))
+
+    def put_price(sigma):
+        greeks = black_scholes_put_greeks(1.0, level, T, r, sigma)
+        return greeks["price"] * 100, greeks["vega"] * 100
+
+    lower_price, _ = put_price(np.full_like(price, lower))
+    upper_price, _ = put_price(np.full_like(price, upper))
+    feasible = (level > 0) & (T > 0) & (price >= lower_price) & (price <= upper_price)
+    volatility = _solve_increasing(put_price, np.clip(price, lower_price, upper_price), lower, upper)
+    return np.where(feasible, volatility, np.nan)
+
+def solve_guarantee_batch(clients, risk_free_rate=0.02, volatility=0.15):
+    """
+    Inverse Bewertung für eine ganze Kundenliste in einem Aufruf. Erwartet die
+    Spalten contribution und duration sowie
+    - budget (EUR): ergänzt max_guarantee_level und max_guarantee_level_pct (abgerundet auf 1%)
+    - guarantee_rate und quoted_price (EUR): ergänzt implied_volatility
+    Optionale Spalten volatility und risk_free_rate überschreiben die Standardwerte.
+    """
+    result = clients.copy()
+    paid_in = result["contribution"].to_numpy(dtype=float) * result["duration"].to_numpy(dtype=float) * 12
+    rates = result["risk_free_rate"].to_numpy(dtype=float) if "risk_free_rate" in result else risk_free_rate
+    result["paid_in"] = paid_in
+
+    if "budget" in result:
+        vols = result["volatility"].to_numpy(dtype=float) if "volatility" in result else volatility
+        levels = solve_guarantee_level(result["budget"].to_numpy(dtype=float) / paid_in * 100,
+                                       result["duration"].to_numpy(dtype=float), rates, vols)
+        result["max_guarantee_level"] = levels
+        result["max_guarantee_level_pct"] = np.floor(levels * 100 + 1e-9)
+
+    if "guarantee_rate" in result and "quoted_price" in result:
+        result["implied_volatility"] = implied_volatility(result["quoted_price"].to_numpy(dtype=float) / paid_in * 100,
+                                                          result["guarantee_rate"].to_numpy(dtype=float),
+                                                          result["duration"].to_numpy(dtype=float), rates)
+    return result
+
+# Zeichenfunktionen für charts.render_chart: zeichnen in eine übergebene Figure statt über pyplot
+
+def plot_guarantee_vs_cost(fig, surface, volatility, time_horizon, risk_free_rate):
+    guarantee_levels = surface["guarantee_levels"]
+    option_prices = surface_slice(surface, volatility, time_horizon, risk_free_rate)
+    ax = fig.subplots()
+    ax.plot(guarantee_levels * 100, option_prices, marker='o')
+    ax.set_title('Kosten der Garantie in Abhängigkeit vom Garantieniveau')
+    ax.set_xlabel('Garantieniveau (%)')
+    ax.set_ylabel('Optionskosten (% der Investition)')
+    ax.grid(True)
+
+def plot_sensitivity_volatility(fig, surface, time_horizon, risk_free_rate, vols=SENSITIVITY_VOLATILITIES):
+    guarantee_levels = surface["guarantee_levels"]
+    ax = fig.subplots()
     for vol in vols:
-        prices = calculate_option_prices(initial_investment, time_horizon, risk_free_rate, vol, guarantee_levels)
-        plt.plot(guarantee_levels * 100, prices, marker='o', label=f'Volatilität: {int(vol * 100)}%')
-    plt.title('Sensitivität: Volatilität der Fondsanlage')
-    plt.xlabel('Garantieniveau (%)')
-    plt.ylabel('Optionskosten (% der Investition)')
-    plt.legend()
-    plt.grid(True)
-    plt.show()
-
-def plot_sensitivity_time(initial_investment, risk_free_rate, volatility, guarantee_levels):
-    terms = [10, 20, 30, 40]
-    plt.figure(figsize=(10, 6))
+        prices = surface_slice(surface, vol, time_horizon, risk_free_rate)
+        ax.plot(guarantee_levels * 100, prices, marker='o', label=f'Volatilität: {int(vol * 100)}%')
+    ax.set_title('Sensitivität: Volatilität der Fondsanlage')
+    ax.set_xlabel('Garantieniveau (%)')
+    ax.set_ylabel('Optionskosten (% der Investition)')
+    ax.legend()
+    ax.grid(True)
+
+def plot_sensitivity_time(fig, surface, volatility, risk_free_rate, terms=SENSITIVITY_TERMS):
+    guarantee_levels = surface["guarantee_levels"]
+    ax = fig.subplots()
     for term in terms:
-        prices = calculate_option_prices(initial_investment, term, risk_free_rate, volatility, guarantee_levels)
-        plt.plot(guarantee_levels * 100, prices, marker='o', label=f'Laufzeit: {term} Jahre')
-    plt.title('Sensitivität: Laufzeit der Versicherung')
-    plt.xlabel('Garantieniveau (%)')
-    plt.ylabel('Optionskosten (% der Investition)')
-    plt.legend()
-    plt.grid(True)
-    plt.show()
+        prices = surface_slice(surface, volatility, term, risk_free_rate)
+        ax.plot(guarantee_levels * 100, prices, marker='o', label=f'Laufzeit: {term} Jahre')
+    ax.set_title('Sensitivität: Laufzeit der Versicherung')
+    ax.set_xlabel('Garantieniveau (%)')
+    ax.set_ylabel('Optionskosten (% der Investition)')
+    ax.legend()
+    ax.grid(True)
@@ -0,0 +1,192 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from guarantee_calculation import black_scholes_put
+
+def contribution_guarantee_setup(contribution, duration, guarantee_rate, risk_free_rate, volatility,
+                                 insurance_cost_rate=0.0, setup_cost_rate=0.0):
+    """
+    Beschreibt die Beitragsgarantie: monatliche Beiträge am Monatsende (wie in
+    run_simulation), abzüglich Abschlusskosten investiert, laufende
+    Versicherungskosten als stetiger Abzug vom Fondsvermögen. Garantiert wird
+    guarantee_rate * eingezahlte Beiträge zum Laufzeitende.
+
+    Enthält zusätzlich die Parameter der Kontrollvariate: ein europäischer Put
+    auf einen Einmalbetrag, der ab Monat control_month investiert wird und
+    dieselbe erwartete Endsumme wie der Fonds hat. Sein Preis folgt exakt aus
+    black_scholes_put.
+    """
+    months = int(duration * 12)
+    dt = 1 / 12
+    maturity = months * dt
+    net_contribution = contribution * (1 - setup_cost_rate)
+    strike = guarantee_rate * contribution * months
+
+    # Restlaufzeit jedes Beitrags
+    remaining = maturity - np.arange(1, months + 1) * dt
+    expected_values = net_contribution * np.exp((risk_free_rate - insurance_cost_rate) * remaining)
+
+    # Kontroll-Einmalbetrag läuft über die nach Endwert gewichtete mittlere Restlaufzeit
+    effective_term = expected_values @ remaining / expected_values.sum()
+    control_month = int(np.clip(np.round((maturity - effective_term) / dt), 0, months - 1))
+    control_term = maturity - control_month * dt
+
+    expected_fund = expected_values.sum()
+    control_notional = expected_fund * np.exp(-(risk_free_rate - insurance_cost_rate) * control_term)
+    control_spot = control_notional * np.exp(-insurance_cost_rate * control_term)
+    control_price = np.exp(-risk_free_rate * control_month * dt) * black_scholes_put(
+        control_spot, strike, control_term, risk_free_rate, volatility
+    )
+
+    return {
+        "months": months,
+        "dt": dt,
+        "maturity": maturity,
+        "net_contribution": net_contribution,
+        "strike": strike,
+        "risk_free_rate": risk_free_rate,
+        "volatility": volatility,
+        "insurance_cost_rate": insurance_cost_rate,
+        "control_month": control_month,
+        "control_spot": control_spot,
+        "control_price": control_price,
+    }
+
+def _simulate_batch(setup, n_pairs, seed_sequence):
+    """
+    Simuliert n_pairs antithetische Pfadpaare und liefert die Summen, die für
+    den gepoolten Kontrollvariaten-Schätzer gebraucht werden.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    dt = setup["dt"]
+    sigma = setup["volatility"]
+    drift = (setup["risk_free_rate"] - 0.5 * sigma ** 2) * dt
+    fee = np.exp(-setup["insurance_cost_rate"] * dt)
+
+    fund = np.zeros(2 * n_pairs)
+    log_growth = np.zeros(2 * n_pairs)  # log(S_T / S_control)
+    step = np.empty(2 * n_pairs)
+
+    for month in range(setup["months"]):
+        z = rng.standard_normal(n_pairs)
+        step[:n_pairs] = z
+        step[n_pairs:] = -z
+        step *= sigma * np.sqrt(dt)
+        step += drift
+        fund *= np.exp(step) * fee
+        fund += setup["net_contribution"]
+        if month >= setup["control_month"]:
+            log_growth += step
+
+    discount = np.exp(-setup["risk_free_rate"] * setup["maturity"])
+    payoff = discount * np.maximum(setup["strike"] - fund, 0)
+    control = discount * np.maximum(setup["strike"] - setup["control_spot"] * np.exp(log_growth), 0)
+
+    # Antithetische Paare mitteln -> unabhängige Stichproben
+    x = 0.5 * (payoff[:n_pairs] + payoff[n_pairs:])
+    y = 0.5 * (control[:n_pairs] + control[n_pairs:])
+    return np.array([n_pairs, x.sum(), y.sum(), x @ x, y @ y, x @ y])
+
+def _combine(stats, control_price):
+    n, sx, sy, sxx, syy, sxy = stats
+    mean_x, mean_y = sx / n, sy / n
+    var_x = (sxx - n * mean_x ** 2) / (n - 1)
+    var_y = (syy - n * mean_y ** 2) / (n - 1)
+    cov_xy = (sxy - n * mean_x * mean_y) / (n - 1)
+
+    beta = cov_xy / var_y if var_y > 0 else 0.0
+    price = mean_x - beta * (mean_y - control_price)
+    residual_var = max(var_x - beta * cov_xy, 0.0)
+    return price, np.sqrt(residual_var / n), np.sqrt(max(var_x, 0.0) / n), beta
+
+# Ein langlebiger Pool pro Prozess und Größe. Worker werden per forkserver bzw. spawn
+# gestartet, da fork aus dem mehrfädigen Streamlit-Server (Job-Threads) nicht sicher ist.
+_executors = {}
+_executors_pid = None
+_executors_lock = threading.Lock()
+
+def _get_executor(max_workers):
+    global _executors, _executors_pid
+    with _executors_lock:
+        if _executors_pid != os.getpid():
+            _executors = {}
+            _executors_pid = os.getpid()
+        if max_workers not in _executors:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _executors[max_workers] = ProcessPoolExecutor(max_workers=max_workers,
+                                                          mp_context=multiprocessing.get_context(method))
+        return _executors[max_workers]
+
+def _discard_executor(max_workers):
+    # Abgestürzter Pool wird beim nächsten Aufruf neu angelegt
+    with _executors_lock:
+        executor = _executors.pop(max_workers, None)
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def price_contribution_guarantee(contribution, duration, guarantee_rate, risk_free_rate, volatility,
+                                 insurance_cost_rate=0.0, setup_cost_rate=0.0, target_se=None,
+                                 max_paths=1_000_000, batch_paths=20_000, batches_per_round=8,
+                                 max_workers=None, seed=None, progress=None):
+    """
+    Monte-Carlo-Preis der Beitragsgarantie mit antithetischen Variaten und
+    Kontrollvariate. Pfade werden in Batches auf einen Prozess-Pool verteilt;
+    Batch i verwendet immer das i-te Kind von SeedSequence(seed), das Ergebnis
+    hängt daher nicht von der Anzahl der Prozesse ab. Nach jeder Runde wird
+    abgebrochen, sobald der Standardfehler target_se (EUR) erreicht.
+
+    progress(Anteil, Zwischenstand) wird nach jeder Runde mit dem bisherigen
+    Preis und Standardfehler aufgerufen und darf zum Abbrechen eine Exception werfen.
+    """
+    setup = contribution_guarantee_setup(contribution, duration, guarantee_rate, risk_free_rate, volatility,
+                                         insurance_cost_rate, setup_cost_rate)
+    paid_in = contribution * setup["months"]
+    if setup["strike"] <= 0 or setup["months"] == 0:
+        return {"price": 0.0, "price_pct": 0.0, "standard_error": 0.0, "plain_standard_error": 0.0,
+                "n_paths": 0, "beta": 0.0, "converged": True}
+
+    n_pairs = max(batch_paths // 2, 1)
+    max_batches = max(int(np.ceil(max_paths / (2 * n_pairs))), 1)
+    seeds = np.random.SeedSequence(seed).spawn(max_batches)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    stats = np.zeros(6)
+    done = 0
+    executor = _get_executor(max_workers) if max_workers > 1 else None
+    while done < max_batches:
+        round_seeds = seeds[done:done + batches_per_round]
+        if executor is None:
+            results = [_simulate_batch(setup, n_pairs, s) for s in round_seeds]
+        else:
+            try:
+                results = list(executor.map(_simulate_batch, [setup] * len(round_seeds),
+                                            [n_pairs] * len(round_seeds), round_seeds))
+            except BrokenProcessPool:
+                _discard_executor(max_workers)
+                raise
+        stats += np.sum(results, axis=0)
+        done += len(round_seeds)
+
+        price, standard_error, plain_standard_error, beta = _combine(stats, setup["control_price"])
+        if target_se is not None and standard_error <= target_se:
+            break
+        if progress is not None:
+            # Benötigte Pfade wachsen mit (Standardfehler / Ziel)^2
+            fraction = done / max_batches
+            if target_se is not None and standard_error > 0:
+                fraction = max(fraction, (target_se / standard_error) ** 2)
+            progress(min(fraction, 1.0), {"price": price, "standard_error": standard_error, "n_paths": int(stats[0]) * 2})
+
+    return {
+        "price": price,
+        "price_pct": price / paid_in * 100,
+        "standard_error": standard_error,
+        "plain_standard_error": plain_standard_error,
+        "n_paths": int(stats[0]) * 2,
+        "beta": beta,
+        "converged": bool(target_se is None or standard_error <= target_se),
+    }
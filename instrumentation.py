@@ -0,0 +1,308 @@
+import contextvars
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from caching import add_lookup_listener
+
+# Konfiguration über Umgebungsvariablen:
+# VITAVERDE_METRICS_LOG=0  keine JSON-Logzeilen
+# VITAVERDE_METRICS_FILE  Pfad für Metriken im Prometheus-Textformat (z.B. für den node_exporter textfile collector)
+# VITAVERDE_DEBUG=1  Laufzeitübersicht pro Rerun in der Sidebar
+# VITAVERDE_PROFILE_SLOW_SECONDS  Sampling-Profiler aktivieren, Reruns über dieser Dauer werden gespeichert
+# VITAVERDE_PROFILE_DIR  Zielverzeichnis der Profile (collapsed stacks, z.B. für flamegraph.pl / speedscope)
+METRICS_LOG = os.environ.get("VITAVERDE_METRICS_LOG", "1") != "0"
+METRICS_FILE = os.environ.get("VITAVERDE_METRICS_FILE")
+DEBUG = os.environ.get("VITAVERDE_DEBUG", "") == "1"
+PROFILE_SLOW_SECONDS = float(os.environ["VITAVERDE_PROFILE_SLOW_SECONDS"]) if os.environ.get("VITAVERDE_PROFILE_SLOW_SECONDS") else None
+PROFILE_DIR = os.environ.get("VITAVERDE_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "vitaverde_profiles"))
+PROFILE_INTERVAL = 0.005
+
+logger = logging.getLogger("vitaverde.metrics")
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current_trace = contextvars.ContextVar("vitaverde_trace", default=None)
+_rerun_ids = itertools.count(1)
+
+class RerunTrace:
+    """
+    Sammelt die Stufen eines Script-Durchlaufs (Rerun) inklusive Verschachtelung,
+    Cache-Treffern und Ausgabegrößen.
+    """
+    def __init__(self, name="main", started=None):
+        self.name = name
+        self.rerun_id = next(_rerun_ids)
+        self.started = started if started is not None else time.perf_counter()
+        self.duration = None
+        self.records = []
+        self.cache_lookups = Counter()
+        self.profile_path = None
+        self._open = []
+
+    def elapsed(self):
+        return self.duration if self.duration is not None else time.perf_counter() - self.started
+
+class _Metrics:
+    """
+    Prozessweite Summen über alle Sessions für den Prometheus-Export.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stage_seconds = defaultdict(float)
+        self.stage_calls = Counter()
+        self.stage_bytes = {}
+        self.cache_lookups = Counter()
+        self.reruns = 0
+        self.rerun_seconds = 0.0
+        self.last_rerun_seconds = 0.0
+        self.slow_reruns = 0
+        self.open_figures = 0
+        self.startup_seconds = None
+        self.sessions = 0
+        self.last_first_render_seconds = 0.0
+
+    def to_prometheus(self):
+        with self.lock:
+            lines = [
+                "# HELP vitaverde_stage_seconds_total Time spent per pipeline stage.",
+                "# TYPE vitaverde_stage_seconds_total counter",
+                *(f'vitaverde_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}' for stage, seconds in sorted(self.stage_seconds.items())),
+                "# HELP vitaverde_stage_calls_total Executions per pipeline stage.",
+                "# TYPE vitaverde_stage_calls_total counter",
+                *(f'vitaverde_stage_calls_total{{stage="{stage}"}} {calls}' for stage, calls in sorted(self.stage_calls.items())),
+                "# HELP vitaverde_stage_output_bytes Size of the last buffer produced by a stage.",
+                "# TYPE vitaverde_stage_output_bytes gauge",
+                *(f'vitaverde_stage_output_bytes{{stage="{stage}"}} {size}' for stage, size in sorted(self.stage_bytes.items())),
+                "# HELP vitaverde_cache_lookups_total Cache lookups per cached stage.",
+                "# TYPE vitaverde_cache_lookups_total counter",
+                *(f'vitaverde_cache_lookups_total{{cache="{cache}",result="{result}"}} {count}'
+                  for (cache, result), count in sorted(self.cache_lookups.items())),
+                "# TYPE vitaverde_reruns_total counter",
+                f"vitaverde_reruns_total {self.reruns}",
+                "# TYPE vitaverde_rerun_seconds_total counter",
+                f"vitaverde_rerun_seconds_total {self.rerun_seconds:.6f}",
+                "# TYPE vitaverde_last_rerun_seconds gauge",
+                f"vitaverde_last_rerun_seconds {self.last_rerun_seconds:.6f}",
+                "# TYPE vitaverde_slow_reruns_total counter",
+                f"vitaverde_slow_reruns_total {self.slow_reruns}",
+                "# TYPE vitaverde_sessions_total counter",
+                f"vitaverde_sessions_total {self.sessions}",
+                "# HELP vitaverde_last_first_render_seconds Time to first render of the most recent new session.",
+                "# TYPE vitaverde_last_first_render_seconds gauge",
+                f"vitaverde_last_first_render_seconds {self.last_first_render_seconds:.6f}",
+                *([
+                    "# HELP vitaverde_startup_seconds Import time of the app modules at process start.",
+                    "# TYPE vitaverde_startup_seconds gauge",
+                    f"vitaverde_startup_seconds {self.startup_seconds:.6f}",
+                ] if self.startup_seconds is not None else []),
+                "# HELP vitaverde_open_figures Open matplotlib figures after the last rerun.",
+                "# TYPE vitaverde_open_figures gauge",
+                f"vitaverde_open_figures {self.open_figures}",
+            ]
+        return "\n".join(lines) + "\n"
+
+metrics = _Metrics()
+
+def _emit(event):
+    if METRICS_LOG:
+        logger.info(json.dumps(event, default=str))
+
+def _write_metrics_file():
+    if not METRICS_FILE:
+        return
+    tmp_path = f"{METRICS_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(metrics.to_prometheus())
+    os.replace(tmp_path, METRICS_FILE)
+
+def _on_cache_lookup(cache, found):
+    result = "hit" if found else "miss"
+    with metrics.lock:
+        metrics.cache_lookups[(cache, result)] += 1
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.cache_lookups[(cache, result)] += 1
+        if trace._open:
+            trace._open[-1]["cache_hits" if found else "cache_misses"] += 1
+
+add_lookup_listener(_on_cache_lookup)
+
+@contextmanager
+def stage(name, **fields):
+    """
+    Misst eine Pipeline-Stufe. Der gelieferte Eintrag kann um Kennzahlen
+    ergänzt werden, z.B. record["bytes"] für die Größe eines erzeugten Buffers.
+    Außerhalb eines Reruns (z.B. Download-Callbacks) wird nur geloggt.
+    """
+    trace = _current_trace.get()
+    record = {"stage": name, "depth": len(trace._open) if trace else 0, "cache_hits": 0, "cache_misses": 0, **fields}
+    if trace is not None:
+        record["start"] = time.perf_counter() - trace.started
+        trace.records.append(record)
+        trace._open.append(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - started
+        if trace is not None:
+            trace._open.pop()
+        with metrics.lock:
+            metrics.stage_seconds[name] += record["seconds"]
+            metrics.stage_calls[name] += 1
+            if "bytes" in record:
+                metrics.stage_bytes[name] = record["bytes"]
+        _emit({"event": "stage", "rerun": trace.rerun_id if trace else None, **record})
+        if trace is None:
+            _write_metrics_file()
+
+def buffer_size(buffer):
+    return buffer.getbuffer().nbytes
+
+class SamplingProfiler:
+    """
+    Einfacher Sampling-Profiler: ein Hintergrund-Thread liest alle interval
+    Sekunden den Stack des Script-Threads und zählt identische Stacks.
+    """
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="vitaverde-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+def _count_open_figures():
+    # pyplot nur abfragen, wenn es bereits geladen ist
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    return len(pyplot.get_fignums()) if pyplot is not None else 0
+
+# Module, deren Import den Start merklich verlangsamt und die daher erst bei Bedarf geladen werden
+HEAVY_MODULES = ["scipy", "fpdf", "fontTools", "openpyxl", "yfinance", "matplotlib", "requests"]
+
+def record_startup(import_seconds):
+    """
+    Meldet einmal pro Prozess die Importzeit der App-Module und welche
+    schweren Abhängigkeiten dabei bereits geladen wurden.
+    """
+    with metrics.lock:
+        if metrics.startup_seconds is not None:
+            return
+        metrics.startup_seconds = import_seconds
+    _emit({
+        "event": "startup",
+        "import_seconds": import_seconds,
+        "heavy_modules_loaded": [module for module in HEAVY_MODULES if module in sys.modules],
+    })
+
+@contextmanager
+def rerun(name="main", started=None, new_session=False):
+    """
+    Klammert einen Script-Durchlauf: am Ende werden eine JSON-Zusammenfassung
+    geloggt, die Prometheus-Datei aktualisiert und langsame Reruns mit dem
+    Sampling-Profiler gespeichert (falls aktiviert).
+
+    started (perf_counter) erlaubt, die Imports des Scripts mitzumessen; für
+    den ersten Durchlauf einer Session (new_session) ist die Dauer damit die
+    Zeit bis zur ersten Anzeige.
+    """
+    trace = RerunTrace(name, started)
+    token = _current_trace.set(trace)
+    profiler = None
+    if PROFILE_SLOW_SECONDS is not None:
+        profiler = SamplingProfiler(threading.get_ident())
+        profiler.start()
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.duration = time.perf_counter() - trace.started
+        slow = PROFILE_SLOW_SECONDS is not None and trace.duration >= PROFILE_SLOW_SECONDS
+        if profiler is not None:
+            profiler.stop()
+            if slow:
+                file_name = f"rerun-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{trace.rerun_id}.folded"
+                trace.profile_path = profiler.write_folded(os.path.join(PROFILE_DIR, file_name))
+
+        open_figures = _count_open_figures()
+        with metrics.lock:
+            metrics.reruns += 1
+            metrics.rerun_seconds += trace.duration
+            metrics.last_rerun_seconds = trace.duration
+            metrics.slow_reruns += slow
+            metrics.open_figures = open_figures
+            if new_session:
+                metrics.sessions += 1
+                metrics.last_first_render_seconds = trace.duration
+        _emit({
+            "event": "rerun",
+            "rerun": trace.rerun_id,
+            "name": name,
+            "seconds": trace.duration,
+            "stages": len(trace.records),
+            "cache_hits": sum(count for (_, result), count in trace.cache_lookups.items() if result == "hit"),
+            "cache_misses": sum(count for (_, result), count in trace.cache_lookups.items() if result == "miss"),
+            "open_figures": open_figures,
+            "profile": trace.profile_path,
+            "new_session": new_session,
+        })
+        _write_metrics_file()
+
+def flame_summary(trace, width=24):
+    """
+    Textuelle Flame-Übersicht: eine Zeile pro Stufe, eingerückt nach
+    Verschachtelung, Balken relativ zur bisherigen Dauer des Reruns.
+    """
+    total = max(trace.elapsed(), 1e-9)
+    lines = []
+    for record in trace.records:
+        seconds = record.get("seconds", time.perf_counter() - trace.started - record["start"])
+        offset = int(width * record["start"] / total)
+        length = max(1, int(round(width * seconds / total)))
+        bar = (" " * offset + "█" * length)[:width].ljust(width)
+        details = []
+        if record["cache_hits"] or record["cache_misses"]:
+            details.append(f"cache {record['cache_hits']}/{record['cache_hits'] + record['cache_misses']}")
+        if "bytes" in record:
+            details.append(f"{record['bytes'] / 1024:.0f} KiB")
+        label = ("  " * record["depth"] + record["stage"])[:28]
+        lines.append(f"{label:<28} |{bar}| {seconds * 1000:8.1f} ms  {', '.join(details)}")
+    lines.append(f"{'total':<28}  {'':{width}}  {total * 1000:8.1f} ms")
+    return "\n".join(lines)
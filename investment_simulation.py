@@ -1,41 +1,55 @@
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from utils import get_close_prices
+from fund_statistics import get_fund_statistics
 
 def calculate_expected_returns(data):
-    monthly_returns = data['Close'].pct_change().dropna()
+    monthly_returns = get_close_prices(data).pct_change().dropna()
     mean_return = monthly_returns.mean()
     volatility = monthly_returns.std()
     return mean_return, volatility
 
-def simulate_investment(start_date, end_date, monthly_contribution, selected_funds, allocations, fund_data, rebalancing_cost=0.00003):
-    # Initialisiere das Kapital und die Zeitreihe
-    current_date = start_date
-    total_capital = 0
-    time_series = []
-
-    while current_date <= end_date:
-        # Füge monatlichen Beitrag hinzu
-        monthly_contributions = {fund: monthly_contribution * allocations[fund] / 100 for fund in selected_funds}
-
-        # Berechne Renditen und aktualisiere Kapital
-        for fund, contribution in monthly_contributions.items():
-            data = fund_data.get(fund)
-            if data is None or data.empty:
-                continue
-
-            mean_return, volatility = calculate_expected_returns(data)
-
-            # Aktualisiere Kapital mit Rendite und ziehe Kosten ab
-            total_capital += contribution * (1 + mean_return - rebalancing_cost)
-
-        # Füge Kapitalstand zur Zeitreihe hinzu
-        time_series.append((current_date, total_capital))
-
-        # Aktualisiere das Datum für den nächsten Monat
-        current_date += timedelta(days=30)  # Ungefähre Monatsdauer
-
-    # Erstelle DataFrame für die Zeitreihe
-    df_time_series = pd.DataFrame(time_series, columns=['Date', 'Capital'])
-
-    return df_time_series
+def simulate_investment(start_date, end_date, monthly_contribution, selected_funds, allocations, fund_data, rebalancing_cost=0.00003, fund_statistics=None):
+    """
+    Spielt die tatsächlichen historischen Monatsrenditen jedes Fonds ab.
+
+    Beiträge fallen zu jedem Monatsende zwischen start_date und end_date an.
+    Jeder Kalendermonat erhält die Rendite desselben Monats aus fund_data;
+    liegt er außerhalb der Historie, wird die Historie zyklisch in ganzen
+    Jahren wiederholt, sodass Kalendermonate (Saisonalität) erhalten bleiben.
+    Nur bei weniger als zwölf Monaten Historie wird ohne diese Ausrichtung
+    wiederholt. Das Kapital folgt aus kumulierten Produkten statt einer Monatsschleife:
+    K_t = G_t * sum_{s<=t} c / G_s mit G_t = prod_{s<=t} (1 + r_s).
+
+    Aufrufer sollten fund_statistics (get_fund_statistics über das ganze
+    Fondsuniversum) übergeben: sonst dominiert das Hashen der Kursdaten für
+    den Cache-Zugriff die Laufzeit (ca. 8x).
+    """
+    fund_statistics = fund_statistics or get_fund_statistics(fund_data)
+
+    months = np.arange(np.datetime64(start_date, "M"), np.datetime64(end_date, "M") + 1)
+    month_ends = (months + 1).astype("datetime64[D]") - np.timedelta64(1, "D")
+    in_range = month_ends <= np.datetime64(end_date, "D")
+    months, month_ends = months[in_range], month_ends[in_range]
+
+    active_funds = [fund for fund in selected_funds if fund in fund_statistics and allocations[fund] > 0]
+    total_capital = np.zeros(len(months))
+
+    if active_funds and len(months):
+        growth = np.empty((len(active_funds), len(months)))
+        for idx, fund in enumerate(active_funds):
+            calendar, replay = fund_statistics.monthly_returns[fund]
+            if len(replay) == 0:
+                raise ValueError(f"{fund}: at least two monthly prices are needed to replay historical returns")
+            offset = (months - calendar[0]).astype(int)
+            # Außerhalb der Historie innerhalb der ersten ganzen Jahre wiederholen
+            period = 12 * (len(replay) // 12) or len(replay)
+            position = np.where((offset >= 0) & (offset < len(replay)), offset, offset % period)
+            growth[idx] = 1 + replay[position] - rebalancing_cost
+
+        contributions = monthly_contribution * np.array([allocations[fund] for fund in active_funds]) / 100
+        cumulative_growth = np.cumprod(growth, axis=1)
+        capital = cumulative_growth * np.cumsum(1 / cumulative_growth, axis=1) * contributions[:, None]
+        total_capital = capital.sum(axis=0)
+
+    return pd.DataFrame({"Date": month_ends.astype("datetime64[ns]"), "Capital": total_capital})
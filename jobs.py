@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from caching import LRUCache, make_key
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    """
+    Eine Hintergrundberechnung. Die Funktion erhält report als progress-Callback;
+    report speichert Fortschritt und Zwischenstand und bricht über JobCancelled
+    ab, sobald der Job storniert wurde.
+    """
+    def __init__(self, key, stage):
+        self.key = key
+        self.stage = stage
+        self.status = "pending"
+        self.progress = 0.0
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.owners = set()
+        self.submitted = time.monotonic()
+        self.finished = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def report(self, fraction, partial=None):
+        if self._cancel.is_set():
+            raise JobCancelled(self.key)
+        self.progress = fraction
+        if partial is not None:
+            self.partial = partial
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+class JobRunner:
+    """
+    Worker-Pool für rechenintensive Stufen, von allen Sessions geteilt.
+
+    Jobs werden über Stufe und Argumente identifiziert (wie die Caches in
+    caching.memoize): ein identischer laufender Job wird nicht erneut gestartet,
+    sondern die Session als weiterer Interessent eingetragen. Jede Session hat
+    pro slot höchstens einen Job; ein neuer Job im selben slot meldet sie vom
+    alten ab, und Jobs ohne Interessenten werden storniert. Fertige Jobs
+    bleiben in einem LRU-Cache abrufbar; fehlgeschlagene nur retry_after
+    Sekunden, damit die Sessions den Fehler sehen, danach wird neu gerechnet.
+    """
+    def __init__(self, max_workers=None, keep_finished=256, retry_after=10.0):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1),
+                                            thread_name_prefix="vitaverde-job")
+        self._lock = threading.Lock()
+        self._running = {}
+        self._finished = LRUCache(keep_finished)
+        self._failed = LRUCache(keep_finished, ttl=retry_after)
+        self._slots = {}
+
+    def submit(self, stage, func, *args, owner=None, slot=None, **kwargs):
+        """
+        Startet func(*args, progress=job.report, **kwargs) im Hintergrund oder
+        liefert den bereits laufenden bzw. fertigen Job mit denselben Eingaben.
+        """
+        key = make_key(stage, *args, **kwargs)
+        with self._lock:
+            if owner is not None and slot is not None:
+                previous = self._slots.get((owner, slot))
+                if previous is not None and previous != key:
+                    self._release(previous, owner)
+                self._slots[(owner, slot)] = key
+
+            job = self._running.get(key)
+            if job is None or job.cancelled:
+                job = self._finished_job(key)
+                if job is None:
+                    job = Job(key, stage)
+                    self._running[key] = job
+                    self._executor.submit(self._run, job, func, args, kwargs)
+            if job.done:
+                # Nichts mehr zu stornieren: slot nicht belegen, damit er nicht liegen bleibt
+                if owner is not None and slot is not None:
+                    del self._slots[(owner, slot)]
+            elif owner is not None:
+                job.owners.add(owner)
+            return job
+
+    def _finished_job(self, key):
+        found, job = self._finished.get(key)
+        if not found:
+            found, job = self._failed.get(key)
+        return job
+
+    def get(self, key):
+        with self._lock:
+            job = self._running.get(key)
+            if job is not None:
+                return job
+            return self._finished_job(key)
+
+    def release(self, owner, slot):
+        # Session verlässt den slot, z.B. weil die Eingaben unvollständig sind
+        with self._lock:
+            key = self._slots.pop((owner, slot), None)
+            if key is not None:
+                self._release(key, owner)
+
+    def _release(self, key, owner):
+        job = self._running.get(key)
+        if job is not None:
+            job.owners.discard(owner)
+            if not job.owners:
+                job.cancel()
+
+    def _run(self, job, func, args, kwargs):
+        try:
+            if job.cancelled:
+                raise JobCancelled(job.key)
+            job.status = "running"
+            job.result = func(*args, progress=job.report, **kwargs)
+            job.progress = 1.0
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as exc:
+            job.error = exc
+            job.status = "failed"
+        finally:
+            job.finished = time.monotonic()
+            with self._lock:
+                current = self._running.get(job.key)
+                if current is job:
+                    del self._running[job.key]
+                # Stornierte Jobs werden beim nächsten Bedarf neu gestartet, fehlgeschlagene nach retry_after
+                if job.status == "done":
+                    self._finished.put(job.key, job)
+                elif job.status == "failed":
+                    self._failed.put(job.key, job)
+                # slots geschlossener Sessions verweisen sonst für immer auf den Job; läuft
+                # unter demselben Schlüssel schon ein Ersatz, gehören die slots diesem
+                if current is job or current is None:
+                    for slot_key in [slot_key for slot_key, key in self._slots.items() if key == job.key]:
+                        del self._slots[slot_key]
+                job.owners.clear()
+            job._done.set()
+
+    def stats(self):
+        with self._lock:
+            running = list(self._running.values())
+        return {
+            "running": sum(job.status == "running" for job in running),
+            "pending": sum(job.status == "pending" for job in running),
+            "sessions": len({owner for job in running for owner in job.owners}),
+            "finished": self._finished.stats()["size"],
+            "failed": self._failed.stats()["size"],
+            "slots": len(self._slots),
+        }
+
+_default_runner = None
+
+def get_job_runner():
+    """
+    Prozessweiter Runner; Anzahl Worker über VITAVERDE_JOB_WORKERS.
+    """
+    global _default_runner
+    if _default_runner is None:
+        workers = os.environ.get("VITAVERDE_JOB_WORKERS")
+        _default_runner = JobRunner(max_workers=int(workers) if workers else None)
+    return _default_runner
@@ -0,0 +1,215 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+PRICE_DTYPE = np.dtype([("date", "datetime64[D]"), ("close", "f8")])
+
+class MarketDataProvider(ABC):
+    """
+    Schnittstelle für Kursquellen. download() liefert für jeden gefundenen
+    Ticker eine Series mit Monats-Schlusskursen (DatetimeIndex) ab start,
+    bereinigt um Dividenden und Splits.
+    """
+    @abstractmethod
+    def download(self, tickers, start):
+        pass
+
+class YFinanceProvider(MarketDataProvider):
+    def download(self, tickers, start):
+        import yfinance as yf
+
+        # Ein Aufruf für alle Ticker, yfinance lädt intern parallel; Close ist dividendenbereinigt
+        data = yf.download(list(tickers), start=start, interval="1mo", group_by="column",
+                           progress=False, threads=True, auto_adjust=True)
+        if data.empty:
+            return {}
+
+        close = data["Close"]
+        if isinstance(close, pd.Series):
+            close = close.to_frame(tickers[0])
+        return {ticker: close[ticker].dropna() for ticker in tickers if ticker in close}
+
+class LocalFileProvider(MarketDataProvider):
+    """
+    Liest <directory>/<ticker>.csv mit den Spalten Date und Close, z.B. für
+    Tests oder Installationen ohne Internetzugang.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def download(self, tickers, start):
+        result = {}
+        for ticker in tickers:
+            path = os.path.join(self.directory, f"{ticker}.csv")
+            if not os.path.exists(path):
+                continue
+            prices = pd.read_csv(path, parse_dates=["Date"], index_col="Date")["Close"].dropna()
+            result[ticker] = prices[prices.index >= pd.Timestamp(start)]
+        return result
+
+class MarketDataStore:
+    """
+    Lokaler Kurs-Cache: eine memory-mapped .npy-Datei (date, close) pro Ticker
+    plus index.json mit dem Zeitpunkt des letzten Abrufs.
+
+    Veraltete Ticker (älter als ttl) werden aktualisiert, und zwar nur ab dem
+    letzten gespeicherten Monat, der dabei überschrieben wird, da der laufende
+    Monat noch nicht abgeschlossen ist. Reicht die gespeicherte Historie nicht
+    bis history_years zurück, wird ab dem Beginn des Zeitraums neu geladen.
+    Ticker mit gleichem Startdatum teilen sich einen Provider-Aufruf.
+    Ticker, für die der Provider nichts liefert, werden ebenfalls erst nach
+    Ablauf der ttl erneut angefragt.
+    Im Offline-Modus oder wenn der Provider ausfällt, werden die gespeicherten
+    Daten verwendet.
+    """
+    def __init__(self, cache_dir, provider=None, ttl=timedelta(hours=12), offline=False, history_years=5):
+        self.cache_dir = cache_dir
+        self.provider = provider if provider is not None else YFinanceProvider()
+        self.ttl = ttl
+        self.offline = offline
+        self.history_years = history_years
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, ticker):
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in ticker)
+        return os.path.join(self.cache_dir, f"{safe_name}.npy")
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, "index.json")
+
+    def _read_index(self):
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self._index_path())
+
+    def load(self, ticker):
+        path = self._path(ticker)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=PRICE_DTYPE)
+        return np.load(path, mmap_mode="r")
+
+    def _save(self, ticker, prices):
+        tmp_path = self._path(ticker) + ".tmp.npy"
+        np.save(tmp_path, prices)
+        os.replace(tmp_path, self._path(ticker))
+
+    def _is_stale(self, ticker, index, now):
+        entry = index.get(ticker)
+        if entry is None or not os.path.exists(self._path(ticker)):
+            return True
+        return now - datetime.fromisoformat(entry["fetched_at"]) > self.ttl
+
+    def _covers(self, ticker, index, history_start):
+        # history_from: Beginn des zuletzt vollständig geladenen Zeitraums
+        history_from = index.get(ticker, {}).get("history_from")
+        return history_from is not None and np.datetime64(history_from) <= history_start
+
+    def refresh(self, tickers, now=None, history_years=None):
+        """
+        Aktualisiert die veralteten Ticker und liefert die Liste der
+        tatsächlich aktualisierten Ticker.
+        """
+        now = now or datetime.now()
+        index = self._read_index()
+        history_start = np.datetime64(now.date()) - np.timedelta64(366 * (history_years or self.history_years), "D")
+        backfill = [ticker for ticker in tickers if not self._covers(ticker, index, history_start)]
+        stale = [ticker for ticker in tickers if ticker in backfill or self._is_stale(ticker, index, now)]
+        if self.offline or not stale:
+            return []
+
+        groups = defaultdict(list)
+        for ticker in stale:
+            stored = self.load(ticker)
+            start = history_start if ticker in backfill or not len(stored) else stored["date"][-1]
+            groups[start].append(ticker)
+
+        updated = []
+        fetched = False
+        for start, group in groups.items():
+            try:
+                downloaded = self.provider.download(group, pd.Timestamp(start).date())
+            except Exception:
+                # Quelle nicht erreichbar -> mit dem vorhandenen Stand weiterarbeiten
+                continue
+            fetched = True
+
+            for ticker in group:
+                stored = np.array(self.load(ticker))
+                series = downloaded.get(ticker)
+                if series is not None and not series.empty:
+                    new_prices = np.empty(len(series), dtype=PRICE_DTYPE)
+                    new_prices["date"] = series.index.values.astype("datetime64[D]")
+                    new_prices["close"] = series.to_numpy(dtype=float)
+                    stored = np.concatenate([stored[stored["date"] < new_prices["date"][0]], new_prices])
+                    updated.append(ticker)
+                if ticker in updated or not os.path.exists(self._path(ticker)):
+                    self._save(ticker, stored)
+                # Auch ohne Kurse (z.B. delistet) gilt der Abruf bis zum Ablauf der ttl
+                history_from = start if ticker in backfill else index[ticker]["history_from"]
+                index[ticker] = {"fetched_at": now.isoformat(), "history_from": str(history_from)}
+
+        if fetched:
+            self._write_index(index)
+        return updated
+
+    def get(self, tickers, now=None, history_years=None):
+        """
+        Liefert pro Ticker einen DataFrame mit Spalte 'Close' über die
+        letzten history_years Jahre (Standard: die des Stores; leer, falls
+        keine Daten vorliegen).
+        """
+        now = now or datetime.now()
+        history_years = history_years or self.history_years
+        self.refresh(tickers, now, history_years)
+
+        window_start = np.datetime64(now.date()) - np.timedelta64(366 * history_years, "D")
+        result = {}
+        for ticker in tickers:
+            prices = self.load(ticker)
+            prices = prices[prices["date"] >= window_start]
+            result[ticker] = pd.DataFrame(
+                {"Close": np.array(prices["close"])},
+                index=pd.DatetimeIndex(np.array(prices["date"]), name="Date"),
+            )
+        return result
+
+_default_store = None
+
+def get_default_store():
+    """
+    Konfiguration über Umgebungsvariablen:
+    VITAVERDE_MARKET_DATA_DIR  Cache-Verzeichnis
+    VITAVERDE_MARKET_DATA_SOURCE  Verzeichnis mit <ticker>.csv statt yfinance
+    VITAVERDE_OFFLINE=1  nur den lokalen Cache verwenden
+    VITAVERDE_MARKET_DATA_TTL_HOURS  Gültigkeit des Caches in Stunden
+    VITAVERDE_HISTORY_YEARS  Länge der Kurshistorie (Standard 5 Jahre)
+    """
+    global _default_store
+    if _default_store is None:
+        cache_dir = os.environ.get(
+            "VITAVERDE_MARKET_DATA_DIR",
+            os.path.join(os.path.expanduser("~"), ".cache", "vitaverde", "market_data"),
+        )
+        source_dir = os.environ.get("VITAVERDE_MARKET_DATA_SOURCE")
+        provider = LocalFileProvider(source_dir) if source_dir else YFinanceProvider()
+        _default_store = MarketDataStore(
+            cache_dir,
+            provider=provider,
+            ttl=timedelta(hours=float(os.environ.get("VITAVERDE_MARKET_DATA_TTL_HOURS", 12))),
+            offline=os.environ.get("VITAVERDE_OFFLINE", "") == "1",
+            history_years=int(os.environ.get("VITAVERDE_HISTORY_YEARS", 5)),
+        )
+    return _default_store
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+from fund_statistics import get_fund_statistics
+
+# Szenario -> Perzentil der Endkapital-Verteilung
+SCENARIO_PERCENTILES = {"Optimistic": 95, "Expected": 50, "Pessimistic": 5}
+
+def estimate_return_parameters(selected_funds, fund_data, fund_statistics=None):
+    """
+    Mittelwert-Vektor und Kovarianzmatrix der monatlichen Renditen der
+    ausgewählten Fonds aus den vorberechneten Fondskennzahlen.
+    """
+    fund_statistics = fund_statistics or get_fund_statistics(fund_data)
+    return fund_statistics.mean(selected_funds), fund_statistics.covariance(selected_funds)
+
+def cholesky_factor(cov):
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        # Nearly collinear funds (e.g. two world ETFs) -> clip eigenvalues and retry
+        eigenvalues, eigenvectors = np.linalg.eigh(cov)
+        eigenvalues = np.clip(eigenvalues, 1e-12, None)
+        return np.linalg.cholesky((eigenvectors * eigenvalues) @ eigenvectors.T)
+
+def simulate_paths(mean, cov, fund_contributions, months, n_paths=100_000, seed=None,
+                   chunk_size=20_000, rebalancing_cost=0.00003, record_every=12, progress=None):
+    """
+    Monte-Carlo-Simulation des Fondsvermögens mit korrelierten Monatsrenditen.
+
+    Simuliert n_paths Pfade in Blöcken von chunk_size Pfaden; innerhalb eines Blocks
+    wird jeder Monat als ein Array-Schritt über alle Pfade und Fonds gerechnet.
+    Antithetische Paare (z, -z) halbieren die Anzahl der Zufallszahlen.
+
+    Liefert das Endkapital je Pfad (n_paths,) und das Gesamtkapital alle
+    record_every Monate (n_records, n_paths). progress(Anteil) wird nach jedem
+    simulierten Monat aufgerufen und darf zum Abbrechen eine Exception werfen.
+    """
+    rng = np.random.default_rng(seed)
+    mean = np.asarray(mean, dtype=float)
+    chol = cholesky_factor(np.asarray(cov, dtype=float))
+    contributions = np.asarray(fund_contributions, dtype=float)[:, None]
+    growth_base = (1 + mean - rebalancing_cost)[:, None]
+    n_funds = len(mean)
+
+    record_months = np.arange(record_every - 1, months, record_every)
+    final_capital = np.empty(n_paths)
+    recorded_capital = np.empty((len(record_months), n_paths))
+
+    half_chunk = max(chunk_size // 2, 1)
+    for start in range(0, n_paths, 2 * half_chunk):
+        size = min(2 * half_chunk, n_paths - start)
+        half = (size + 1) // 2
+        shocks = np.empty((n_funds, half))
+        growth = np.empty((n_funds, 2 * half))
+        capital = np.zeros((n_funds, 2 * half))
+        record = 0
+
+        for month in range(months):
+            rng.standard_normal(out=shocks)
+            np.matmul(chol, shocks, out=growth[:, :half])
+            np.negative(growth[:, :half], out=growth[:, half:])
+            growth += growth_base
+            capital *= growth
+            capital += contributions
+            if record < len(record_months) and month == record_months[record]:
+                recorded_capital[record, start:start + size] = capital[:, :size].sum(axis=0)
+                record += 1
+            if progress is not None:
+                progress((start + size * (month + 1) / months) / n_paths)
+
+        final_capital[start:start + size] = capital[:, :size].sum(axis=0)
+
+    return final_capital, recorded_capital
+
+def simulate_distribution(selected_funds, allocations, fund_data, contribution, months,
+                          n_paths=100_000, seed=None, chunk_size=20_000, fund_statistics=None, progress=None):
+    """
+    Simuliert die Verteilung des Endkapitals für die gewählte Allokation.
+    Fonds ohne Daten oder ohne Allokation werden wie in run_simulation übersprungen.
+    """
+    active_funds = [fund for fund in selected_funds
+                    if allocations[fund] > 0 and not fund_data[fund].empty]
+    if not active_funds:
+        return {"final_capital": np.zeros(n_paths), "yearly_percentiles": pd.DataFrame(),
+                "total_contributions": 0.0}
+
+    mean, cov = estimate_return_parameters(active_funds, fund_data, fund_statistics)
+    fund_contributions = [contribution * allocations[fund] / 100 for fund in active_funds]
+    final_capital, yearly_capital = simulate_paths(mean, cov, fund_contributions, months,
+                                                   n_paths=n_paths, seed=seed, chunk_size=chunk_size, progress=progress)
+
+    percentiles = sorted(set(SCENARIO_PERCENTILES.values()))
+    yearly_percentiles = pd.DataFrame(
+        np.percentile(yearly_capital, percentiles, axis=1).T,
+        index=pd.RangeIndex(1, len(yearly_capital) + 1, name="Year"),
+        columns=[f"P{p}" for p in percentiles],
+    )
+
+    return {
+        "final_capital": final_capital,
+        "yearly_percentiles": yearly_percentiles,
+        "total_contributions": sum(fund_contributions) * months,
+    }
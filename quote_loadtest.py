@@ -0,0 +1,119 @@
+"""
+Lasttest für quote_service.py: parallele Keep-Alive-Clients schicken
+POST /quote und messen Latenz (p50/p90/p99) und Durchsatz.
+
+    python quote_service.py --synthetic &
+    python quote_loadtest.py --requests 500 --concurrency 32 --distinct 50
+
+--distinct legt fest, wie viele verschiedene Portfolios gezogen werden;
+wenige verschiedene Portfolios testen den Ergebnis-Cache, viele die Worker.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+from fund_catalog import funds
+
+TICKERS = [details["ticker"] for details in funds.values()]
+
+def random_portfolio(rng, n_paths):
+    tickers = rng.sample(TICKERS, rng.randint(1, 3))
+    cuts = sorted(rng.sample(range(1, 20), len(tickers) - 1))
+    shares = [(end - start) * 5 for start, end in zip([0] + cuts, cuts + [20])]
+    return {
+        "contribution": rng.choice([50, 100, 200, 500]),
+        "duration": rng.choice([10, 15, 20, 25, 30]),
+        "allocations": dict(zip(tickers, shares)),
+        "guarantee_rate": rng.choice([0.0, 0.5, 0.8, 1.0]),
+        "n_paths": n_paths,
+    }
+
+async def _post(reader, writer, host, path, payload):
+    body = json.dumps(payload).encode()
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+async def _client(url, queue, latencies, outcomes):
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        while True:
+            try:
+                payload = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                status, response = await _post(reader, writer, parts.hostname, parts.path or "/quote", payload)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                outcomes.append("error")
+                return
+            latencies.append(time.perf_counter() - start)
+            outcomes.append(response["source"] if status == 200 else "error")
+    finally:
+        writer.close()
+
+async def run_load_test(url, n_requests, concurrency, distinct, n_paths, seed=0):
+    """
+    Schickt n_requests Anfragen über concurrency Verbindungen und liefert
+    Latenz-Perzentile (ms), Durchsatz und die Verteilung der Ergebnisquellen.
+    """
+    rng = random.Random(seed)
+    portfolios = [random_portfolio(rng, n_paths) for _ in range(distinct)]
+    queue = asyncio.Queue()
+    for _ in range(n_requests):
+        queue.put_nowait(rng.choice(portfolios))
+
+    latencies, outcomes = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(url, queue, latencies, outcomes) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    p50, p90, p99 = np.percentile(latencies_ms, [50, 90, 99]) if len(latencies_ms) else (np.nan,) * 3
+    return {
+        "requests": len(outcomes),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(outcomes) / elapsed if elapsed else 0.0,
+        "p50_ms": p50,
+        "p90_ms": p90,
+        "p99_ms": p99,
+        "max_ms": latencies_ms.max() if len(latencies_ms) else np.nan,
+        "sources": {source: outcomes.count(source) for source in sorted(set(outcomes))},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for quote_service.py")
+    parser.add_argument("--url", default="http://127.0.0.1:8765/quote")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--distinct", type=int, default=50, help="number of distinct portfolios")
+    parser.add_argument("--paths", type=int, default=10_000, help="Monte Carlo paths per quote")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load_test(args.url, args.requests, args.concurrency, args.distinct, args.paths, args.seed))
+    print(f"{result['requests']} requests in {result['elapsed_s']:.2f}s ({result['throughput_rps']:.1f} req/s)")
+    print(f"latency p50 {result['p50_ms']:.1f} ms, p90 {result['p90_ms']:.1f} ms, "
+          f"p99 {result['p99_ms']:.1f} ms, max {result['max_ms']:.1f} ms")
+    print("sources: " + ", ".join(f"{source} {count}" for source, count in result["sources"].items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Lokaler HTTP/JSON-Quotierungsdienst für Portal und CRM, ohne Streamlit.
+
+    python quote_service.py --port 8765 --workers 4
+    python quote_service.py --synthetic              # synthetische Kurse statt Marktdaten
+    python quote_service.py --market-data ./prices   # <ticker>.csv mit Date, Close
+
+POST /quote mit einem Objekt (oder einer Liste von Objekten):
+
+    {"contribution": 100, "duration": 20, "allocations": {"URTH": 60, "SPY": 40},
+     "guarantee_rate": 0.5, "setup_cost_rate": 0.02, "death_benefit_option": true,
+     "tax_rate": 0.26, "n_paths": 10000, "seed": 0}
+
+Allokationen dürfen über Ticker oder Fondsnamen angegeben werden und müssen
+100% ergeben; die Quoten (*_rate) liegen zwischen 0 und 1. GET /health und
+GET /stats liefern Status und Kennzahlen.
+
+Die Marktdaten werden beim Start einmal geladen und an alle Worker-Prozesse
+übergeben; Anfragen, die innerhalb von --batch-window ms eintreffen, werden
+gemeinsam an einen Worker geschickt. Ergebnisse werden nach den normalisierten
+Eingaben gecacht, identische laufende Anfragen teilen sich eine Berechnung.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from batch_quote import DEFAULTS, TICKER_TO_FUND, _init_worker, quote_portfolio, validate_terms
+import batch_quote
+from caching import LRUCache
+from fund_catalog import fetch_fund_data, funds, synthetic_fund_data
+
+DEFAULT_PATHS = 10_000
+MAX_PATHS = 200_000
+MAX_CONTRIBUTION = 1_000_000
+FUND_TO_TICKER = {fund: details["ticker"] for fund, details in funds.items()}
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+def _number(value, name):
+    # Endliche JSON-Zahl erwartet; null, Listen, Texte, Booleans sowie NaN/Infinity
+    # (von json.loads akzeptiert) sind ungültig
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return float(value)
+
+def normalize_request(payload):
+    """
+    Prüft eine Anfrage und bringt sie in eine kanonische Form (Ticker,
+    sortierte Allokationen, Standardwerte), die auch als Cache-Schlüssel dient.
+    Ungültige Eingaben ergeben einen ValueError mit der Meldung für den Client.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("request must be a JSON object")
+    for field in ("contribution", "duration", "allocations"):
+        if field not in payload:
+            raise ValueError(f"missing field: {field}")
+
+    contribution, duration = validate_terms(_number(payload["contribution"], "contribution"),
+                                            _number(payload["duration"], "duration"))
+    if contribution > MAX_CONTRIBUTION:
+        raise ValueError(f"contribution must not exceed {MAX_CONTRIBUTION}")
+
+    raw_allocations = payload["allocations"]
+    if not isinstance(raw_allocations, dict) or not raw_allocations:
+        raise ValueError("allocations must be an object of fund or ticker -> percent")
+    allocations = {}
+    for name, value in raw_allocations.items():
+        ticker = FUND_TO_TICKER.get(name, name)
+        if ticker not in TICKER_TO_FUND:
+            raise ValueError(f"unknown fund: {name}")
+        value = _number(value, f"allocation for {name}")
+        if value < 0:
+            raise ValueError(f"negative allocation for {name}")
+        if value > 0:
+            allocations[ticker] = allocations.get(ticker, 0.0) + round(value, 4)
+    if abs(sum(allocations.values()) - 100) > 1e-6:
+        raise ValueError("allocations must sum to 100")
+
+    options = {}
+    for key, default in DEFAULTS.items():
+        value = payload.get(key, default)
+        if isinstance(default, bool):
+            if not isinstance(value, bool):
+                raise ValueError(f"{key} must be true or false")
+            options[key] = value
+        else:
+            # Alle übrigen Optionen sind Quoten (Kosten, Garantie, Steuer)
+            rate = _number(value, key)
+            if not 0 <= rate <= 1:
+                raise ValueError(f"{key} must be between 0 and 1")
+            options[key] = round(rate, 6)
+    n_paths = _number(payload.get("n_paths", DEFAULT_PATHS), "n_paths")
+    if not n_paths.is_integer() or not 1_000 <= n_paths <= MAX_PATHS:
+        raise ValueError(f"n_paths must be a whole number between 1000 and {MAX_PATHS}")
+    seed = _number(payload.get("seed", 0), "seed")
+    if not seed.is_integer() or seed < 0:
+        raise ValueError("seed must be a non-negative whole number")
+
+    return {
+        "contribution": round(contribution, 2),
+        "duration": duration,
+        "allocations": dict(sorted(allocations.items())),
+        **options,
+        "n_paths": int(n_paths),
+        "seed": int(seed),
+    }
+
+def _to_response(summary_df):
+    guarantee_cost = float(summary_df["Guarantee Cost (%)"].iloc[0])
+    scenarios = summary_df.drop(columns=["contract_id", "Guarantee Cost (%)"])
+    records = [{key: value.item() if isinstance(value, np.generic) else value for key, value in row.items()}
+               for row in scenarios.to_dict(orient="records")]
+    return {"guarantee_cost_pct": guarantee_cost, "scenarios": records}
+
+def _quote_batch(requests):
+    # Läuft im Worker-Prozess mit den dort per Initializer gesetzten Marktdaten
+    results = []
+    for request in requests:
+        row = {"contract_id": "", "contribution": request["contribution"], "duration": request["duration"],
+               **request["allocations"], **{key: request[key] for key in DEFAULTS}}
+        try:
+            summary_df = quote_portfolio(row, batch_quote._worker_fund_data, n_paths=request["n_paths"],
+                                         seed=request["seed"], fund_statistics=batch_quote._worker_fund_statistics)
+            results.append((True, _to_response(summary_df)))
+        except Exception as exc:
+            results.append((False, f"{type(exc).__name__}: {exc}"))
+    return results
+
+class QuoteService:
+    def __init__(self, fund_data, max_workers=None, cache_size=10_000, cache_ttl=None, batch_window=0.005, max_batch=16):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker, initargs=(fund_data,))
+        self.cache = LRUCache(cache_size, cache_ttl)
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.pending = {}
+        self.queue = None
+        self.slots = None
+        self.counters = {"requests": 0, "cache_hits": 0, "shared": 0, "computed": 0, "batches": 0, "errors": 0}
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        # Höchstens zwei Batches pro Worker gleichzeitig, der Rest wartet in der Queue
+        self.slots = asyncio.Semaphore(2 * self.max_workers)
+        self._batcher_task = asyncio.create_task(self._batcher())
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    async def quote(self, request):
+        """
+        Liefert (Quote, Quelle) mit Quelle "cache", "shared" oder "computed".
+        """
+        self.counters["requests"] += 1
+        key = json.dumps(request, sort_keys=True)
+        found, quote = self.cache.get(key)
+        if found:
+            self.counters["cache_hits"] += 1
+            return quote, "cache"
+
+        future = self.pending.get(key)
+        source = "shared"
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.pending[key] = future
+            self.queue.put_nowait((key, request))
+            source = "computed"
+        self.counters[source] += 1
+        return await asyncio.shield(future), source
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.slots.acquire()
+            asyncio.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        self.counters["batches"] += 1
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.pool, _quote_batch, [request for _, request in batch])
+        except Exception as exc:
+            results = [(False, f"{type(exc).__name__}: {exc}")] * len(batch)
+        finally:
+            self.slots.release()
+
+        for (key, _), (ok, value) in zip(batch, results):
+            future = self.pending.pop(key)
+            if ok:
+                self.cache.put(key, value)
+                future.set_result(value)
+            else:
+                self.counters["errors"] += 1
+                future.set_exception(RuntimeError(value))
+
+    def stats(self):
+        batches = self.counters["batches"]
+        return {
+            **self.counters,
+            "mean_batch_size": self.counters["computed"] / batches if batches else 0.0,
+            "in_flight": len(self.pending),
+            "workers": self.max_workers,
+            "cache": self.cache.stats(),
+        }
+
+    async def dispatch(self, method, path, body):
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/stats":
+            return 200, self.stats()
+        if path != "/quote":
+            return 404, {"error": "not found"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        try:
+            payload = json.loads(body or b"null")
+            single = not isinstance(payload, list)
+            requests = [normalize_request(item) for item in ([payload] if single else payload)]
+        except (TypeError, ValueError) as exc:
+            return 400, {"error": str(exc)}
+
+        try:
+            results = await asyncio.gather(*(self.quote(request) for request in requests))
+        except RuntimeError as exc:
+            return 500, {"error": str(exc)}
+        responses = [{**quote, "request": request, "source": source} for request, (quote, source) in zip(requests, results)]
+        return 200, responses[0] if single else responses
+
+    async def handle_connection(self, reader, writer):
+        # Minimales HTTP/1.1 mit Keep-Alive, genügt für lokale Clients und den Lasttest
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path = request_line.decode("latin-1").split()[:2]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.dispatch(method, path.split("?")[0], body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+def load_market_data(synthetic=False, market_data_dir=None):
+    if synthetic:
+        return synthetic_fund_data(len(funds))
+    if market_data_dir:
+        from market_data import LocalFileProvider, MarketDataStore
+
+        # Kurs-Cache nur für diesen Start, wird danach wieder gelöscht
+        with tempfile.TemporaryDirectory(prefix="vitaverde_quote_cache_") as cache_dir:
+            store = MarketDataStore(cache_dir, provider=LocalFileProvider(market_data_dir))
+            return fetch_fund_data(list(funds), store=store)
+    return fetch_fund_data(list(funds))
+
+async def serve(host, port, fund_data, **service_options):
+    service = QuoteService(fund_data, **service_options)
+    await service.start()
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"Quote service listening on http://{host}:{port} with {service.max_workers} workers")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON quoting service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--cache-size", type=int, default=10_000, help="cached quotes")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="seconds a cached quote stays valid")
+    parser.add_argument("--batch-window", type=float, default=5.0, help="milliseconds to collect a batch")
+    parser.add_argument("--max-batch", type=int, default=16, help="requests per worker batch")
+    parser.add_argument("--synthetic", action="store_true", help="use synthetic prices instead of market data")
+    parser.add_argument("--market-data", help="directory with <ticker>.csv files (Date, Close)")
+    args = parser.parse_args()
+
+    fund_data = load_market_data(args.synthetic, args.market_data)
+    try:
+        asyncio.run(serve(args.host, args.port, fund_data, max_workers=args.workers, cache_size=args.cache_size,
+                          cache_ttl=args.cache_ttl, batch_window=args.batch_window / 1000, max_batch=args.max_batch))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
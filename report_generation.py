@@ -1,58 +1,102 @@
+import copy
+import os
 from fpdf import FPDF
+from fontTools import ttLib
 import pandas as pd
 from io import BytesIO
-import tempfile
 from datetime import datetime
+from assets import ASSET_DIR, read_asset
+from charts import render_chart
+
+# openpyxl wird erst beim ersten Excel-Bericht importiert; die App importiert
+# dieses Modul selbst erst beim ersten Bericht, damit der Start nicht auf fpdf wartet
+
+# Mitgelieferte Unicode-Schrift statt der latin1-Kernschriften
+FONT_PATH = os.path.join(ASSET_DIR, "DejaVuSans.ttf")
+FONT_FAMILY = "DejaVu"
 
 class PDF(FPDF):
+    def register_fonts(self):
+        self.add_font(FONT_FAMILY, "", FONT_PATH)
+
+    def set_font(self, family=None, style="", size=0):
+        # Es liegt nur der normale Schnitt bei, fett/kursiv werden darauf abgebildet
+        if family == FONT_FAMILY:
+            style = ""
+        super().set_font(family, style, size)
+
     def header(self):
-        self.set_font("Arial", "B", 12)
-        self.cell(0, 10, "Allianz VitaVerde - Simulation Report", 0, 1, "C")
+        self.set_font(FONT_FAMILY, "B", 12)
+        self.cell(0, 10, "Allianz VitaVerde - Simulation Report", align="C", new_x="LMARGIN", new_y="NEXT")
 
     def footer(self):
         self.set_y(-15)
-        self.set_font("Arial", "I", 8)
-        self.cell(0, 10, f"Generated by Allianz VitaVerde Simulator - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 0, 0, "C")
+        self.set_font(FONT_FAMILY, "I", 8)
+        self.cell(0, 10, f"Generated by Allianz VitaVerde Simulator - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", align="C")
+
+_pdf_template = None
+
+def get_pdf_template():
+    """
+    Leeres PDF mit registrierten Schriften. Das Einlesen der TTF-Datei passiert
+    so nur einmal pro Prozess; jedes Dokument startet als Kopie dieser Vorlage.
+    """
+    global _pdf_template
+    if _pdf_template is None:
+        _pdf_template = PDF()
+        _pdf_template.register_fonts()
+    return _pdf_template
+
+def new_pdf_document():
+    pdf = copy.deepcopy(get_pdf_template())
+    # fpdf2 teilt beim Kopieren das fontTools-Objekt, das beim Subsetting in output()
+    # verändert wird; jedes Dokument bekommt daher ein eigenes (lazy aus dem Speicher)
+    for font in pdf.fonts.values():
+        font.ttfont = ttLib.TTFont(BytesIO(read_asset("DejaVuSans.ttf")), recalcTimestamp=False, lazy=True)
+    return pdf
+
+def render_allocation_pie(selected_funds, allocations):
+    return BytesIO(render_chart("allocation_pie", selected_funds, allocations))
+
+def render_scenario_chart(summary_df):
+    return BytesIO(render_chart("scenario_chart", summary_df))
 
 def generate_pdf_report(summary_df, advisor_name, client_name, buffer_pie, buffer_chart,
                         contribution, duration, insurance_cost_rate, setup_cost_rate, death_benefit_option, guarantee_options):
-    pdf = PDF()
+    pdf = new_pdf_document()
     pdf.add_page()
 
-    pdf.set_font("Arial", "", 12)
+    pdf.set_font(FONT_FAMILY, "", 12)
 
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, "Allianz VitaVerde - Simulation Report", ln=True)
-    pdf.set_font("Arial", "I", 10)
-    pdf.cell(0, 10, f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True)
-    pdf.cell(0, 10, f"Advisor: {advisor_name} | Client: {client_name}", ln=True)
+    pdf.set_font(FONT_FAMILY, "B", 16)
+    pdf.cell(0, 10, "Allianz VitaVerde - Simulation Report", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font(FONT_FAMILY, "I", 10)
+    pdf.cell(0, 10, f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(0, 10, f"Advisor: {advisor_name} | Client: {client_name}", new_x="LMARGIN", new_y="NEXT")
 
-    pdf.set_font("Arial", "", 12)
+    pdf.set_font(FONT_FAMILY, "", 12)
     pdf.ln(5)
-    pdf.cell(0, 10, f"Monthly Contribution: {contribution}", ln=True)
-    pdf.cell(0, 10, f"Investment Horizon: {duration} years", ln=True)
-    pdf.cell(0, 10, f"Insurance Cost: {insurance_cost_rate * 100:.2f}%", ln=True)
-    pdf.cell(0, 10, f"Setup Cost: {setup_cost_rate * 100:.2f}%", ln=True)
-    pdf.cell(0, 10, f"Death Benefit Guarantee: {'Yes' if death_benefit_option else 'No'}", ln=True)
-    pdf.cell(0, 10, f"Contribution Guarantee: {guarantee_options}", ln=True)
+    pdf.cell(0, 10, f"Monthly Contribution: {contribution}", new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(0, 10, f"Investment Horizon: {duration} years", new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(0, 10, f"Insurance Cost: {insurance_cost_rate * 100:.2f}%", new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(0, 10, f"Setup Cost: {setup_cost_rate * 100:.2f}%", new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(0, 10, f"Death Benefit Guarantee: {'Yes' if death_benefit_option else 'No'}", new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(0, 10, f"Contribution Guarantee: {guarantee_options}", new_x="LMARGIN", new_y="NEXT")
 
     pdf.ln(10)
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Fund Allocation", ln=True)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmpfile:
-        tmpfile.write(buffer_pie.getvalue())
-        pdf.image(tmpfile.name, w=100)
+    pdf.set_font(FONT_FAMILY, "B", 14)
+    pdf.cell(0, 10, "Fund Allocation", new_x="LMARGIN", new_y="NEXT")
+    # Bilder direkt aus dem Speicher einbetten, ohne temporäre Dateien
+    pdf.image(BytesIO(buffer_pie.getvalue()), w=100)
 
     pdf.ln(10)
-    pdf.cell(0, 10, "Scenario Comparison", ln=True)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmpfile:
-        tmpfile.write(buffer_chart.getvalue())
-        pdf.image(tmpfile.name, w=150)
+    pdf.cell(0, 10, "Scenario Comparison", new_x="LMARGIN", new_y="NEXT")
+    pdf.image(BytesIO(buffer_chart.getvalue()), w=150)
 
     pdf.ln(10)
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Simulation Summary", ln=True)
-    pdf.set_font("Arial", "", 10)
+    pdf.set_font(FONT_FAMILY, "B", 14)
+    pdf.cell(0, 10, "Simulation Summary", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font(FONT_FAMILY, "", 10)
 
     for idx, row in summary_df.iterrows():
         pdf.multi_cell(
@@ -60,24 +104,39 @@ def generate_pdf_report(summary_df, advisor_name, client_name, buffer_pie, buffe
             f"{row['Scenario']}: "
             f"Paid-in: {row['Paid-in Capital (EUR)']} | "
             f"After Tax: {row['After Tax (EUR)']} | "
-            f"Guaranteed Payout: {row['Guaranteed Payout (EUR)']}"
+            f"Guaranteed Payout: {row['Guaranteed Payout (EUR)']}",
+            new_x="LMARGIN", new_y="NEXT"
         )
 
     pdf.set_y(-30)
-    pdf.set_font("Arial", "I", 8)
-    pdf.cell(0, 10, "Generated by Allianz VitaVerde Simulator", 0, 0, 'C')
+    pdf.set_font(FONT_FAMILY, "I", 8)
+    pdf.cell(0, 10, "Generated by Allianz VitaVerde Simulator", align="C")
 
-    # Verwenden Sie dest='S' um die PDF-Daten als String zu erhalten
-    pdf_output = pdf.output(dest='S').encode('latin1')
-    pdf_buffer = BytesIO(pdf_output)
+    # fpdf2 liefert das Dokument direkt als Bytes
+    pdf_buffer = BytesIO(bytes(pdf.output()))
     pdf_buffer.seek(0)
     return pdf_buffer
 
-def generate_excel_report(simulation_results, summary_df):
-    excel_buffer = BytesIO()
-    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-        pd.DataFrame(simulation_results).to_excel(writer, sheet_name="Simulation Results")
-        summary_df.to_excel(writer, sheet_name="Summary", index=False)
+def _write_sheet(workbook, title, df, index):
+    # Zeilenweises Schreiben im write-only-Modus: konstanter Speicherbedarf auch bei langen Zeitreihen
+    sheet = workbook.create_sheet(title)
+    header = [str(col) for col in df.columns]
+    if index:
+        header = [df.index.name or ""] + header
+    sheet.append(header)
+    for row in df.itertuples(index=index, name=None):
+        sheet.append([value.item() if hasattr(value, "item") else value for value in row])
 
+def generate_excel_report(simulation_results, summary_df, time_series=None):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    _write_sheet(workbook, "Simulation Results", pd.DataFrame(simulation_results), index=True)
+    _write_sheet(workbook, "Summary", summary_df, index=False)
+    if time_series is not None:
+        _write_sheet(workbook, "Time Series", time_series, index=True)
+
+    excel_buffer = BytesIO()
+    workbook.save(excel_buffer)
     excel_buffer.seek(0)
     return excel_buffer
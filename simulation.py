@@ -1,9 +1,11 @@
-import streamlit as st
 import numpy as np
 import pandas as pd
 from utils import calculate_tax
+from fund_statistics import get_fund_statistics
+from monte_carlo import SCENARIO_PERCENTILES, simulate_distribution
 
-def calculate_weighted_average_return(selected_funds, allocations, fund_data, rebalancing_cost=0.00003):
+def calculate_weighted_average_return(selected_funds, allocations, fund_data, rebalancing_cost=0.00003, fund_statistics=None):
+    fund_statistics = fund_statistics or get_fund_statistics(fund_data)
     total_weighted_return = 0
     total_allocation = sum(allocations.values())
     
@@ -16,7 +18,7 @@ def calculate_weighted_average_return(selected_funds, allocations, fund_data, re
         if data.empty:
             continue
         
-        mean_return, _ = calculate_expected_returns(data)
+        mean_return, _ = fund_statistics.expected_returns(fund)
         
         # Adjust for rebalancing cost
         adjusted_mean_return = mean_return - rebalancing_cost
@@ -32,10 +34,20 @@ def calculate_weighted_average_return(selected_funds, allocations, fund_data, re
     #st.write(f"Total Weighted Return: {total_weighted_return}")
     return total_weighted_return
 
-def run_simulation(selected_funds, allocations, fund_data, contribution, months, scenario, weighted_average_return):
-    total_capital = np.zeros(months)
-    total_contributions = np.zeros(months)
+SCENARIO_VOLATILITY_SHIFT = {"Optimistic": 1, "Expected": 0, "Pessimistic": -1}
+
+def run_simulation_batch(selected_funds, allocations, fund_data, contribution, months, scenarios, weighted_average_return, rebalancing_cost=0.00003, fund_statistics=None):
+    """
+    Berechnet den Kapitalverlauf aller Szenarien und Fonds in einem Schritt.
 
+    Bei konstantem Monatszins r wächst ein Fonds mit Monatsbeitrag c nach der
+    Rentenformel c * ((1 + r)^(m + 1) - 1) / r, daher ist keine Schleife über
+    die Monate nötig. Liefert total_capital mit Form (Szenarien, Monate) und
+    total_contributions mit Form (Monate,).
+    """
+    fund_statistics = fund_statistics or get_fund_statistics(fund_data)
+    fund_contributions = []
+    volatilities = []
     for fund in selected_funds:
         allocation_pct = allocations[fund] / 100
         data = fund_data[fund]
@@ -43,57 +55,78 @@ def run_simulation(selected_funds, allocations, fund_data, contribution, months,
         if data.empty or allocation_pct == 0:
             continue
 
-        mean_return, volatility = calculate_expected_returns(data)
+        _, volatility = fund_statistics.expected_returns(fund)
+        fund_contributions.append(contribution * allocation_pct)
+        volatilities.append(volatility)
 
-        fund_capital = 0
-        for month in range(months):
-            monthly_contribution = contribution * allocation_pct
-            total_contributions[month] += monthly_contribution
+    total_contributions = np.full(months, float(sum(fund_contributions)))
+    if not fund_contributions:
+        return np.zeros((len(scenarios), months)), total_contributions
 
-            # Adjust monthly return based on scenario
-            if scenario == "Optimistic":
-                adjusted_return = weighted_average_return + volatility
-            elif scenario == "Pessimistic":
-                adjusted_return = weighted_average_return - volatility
-            else:
-                adjusted_return = weighted_average_return
+    # Monatszins je (Szenario, Fonds)
+    shifts = np.array([SCENARIO_VOLATILITY_SHIFT[scenario] for scenario in scenarios], dtype=float)
+    rates = weighted_average_return + shifts[:, None] * np.array(volatilities)[None, :] - rebalancing_cost
 
-            # Apply rebalancing cost
-            adjusted_return -= 0.00003
+    periods = np.arange(1, months + 1)
+    growth = np.power(1 + rates[:, :, None], periods)
+    safe_rates = np.where(rates == 0, 1.0, rates)[:, :, None]
+    annuity = np.where(rates[:, :, None] == 0, periods, (growth - 1) / safe_rates)
 
-            # Debugging-Ausgabe für adjusted_return in Streamlit
-            t.write(f"Month: {month}, Adjusted Return: {adjusted_return}")
+    total_capital = np.einsum("sfm,f->sm", annuity, np.array(fund_contributions))
+    return total_capital, total_contributions
 
-            fund_capital *= (1 + adjusted_return)
-            fund_capital += monthly_contribution
+def run_simulation(selected_funds, allocations, fund_data, contribution, months, scenario, weighted_average_return):
+    total_capital, total_contributions = run_simulation_batch(
+        selected_funds, allocations, fund_data, contribution, months, [scenario], weighted_average_return
+    )
+    return total_capital[0], total_contributions
 
-            # Debugging-Ausgabe für fund_capital vor der Addition in Streamlit
-            #st.write(f"Month: {month}, Fund Capital before addition: {fund_capital}")
 
-            # Sicherstellen, dass fund_capital ein skalarer Wert ist
-            if isinstance(fund_capital, pd.Series):
-                fund_capital = fund_capital.iloc[0]
 
-            total_capital[month] += fund_capital
+def perform_simulation(selected_funds, allocations, fund_data, contribution, duration, tax_rate,
+                       method="monte_carlo", n_paths=20_000, seed=0, return_distribution=False, fund_statistics=None,
+                       progress=None):
+    # Fester Standard-Seed: gleiche Eingaben liefern wie bisher dieselben Szenarien (seed=None für neue Zufallszahlen)
+    months = duration * 12
+    fund_statistics = fund_statistics or get_fund_statistics(fund_data)
 
-            # Debugging-Ausgabe in Streamlit
-            #st.write(f"Month: {month}, Fund: {fund}, Fund Capital: {fund_capital}, Total Capital: {total_capital[month]}")
+    if method == "deterministic":
+        simulation_results = run_deterministic_scenarios(selected_funds, allocations, fund_data, contribution, months, tax_rate, fund_statistics)
+        return (simulation_results, None) if return_distribution else simulation_results
 
-    return total_capital, total_contributions
+    distribution = simulate_distribution(selected_funds, allocations, fund_data, contribution, months, n_paths=n_paths, seed=seed,
+                                         fund_statistics=fund_statistics, progress=progress)
+    total_contribution = distribution["total_contributions"]
 
+    # Szenarien als Perzentile der simulierten Endkapital-Verteilung
+    simulation_results = {}
+    for scenario, percentile in SCENARIO_PERCENTILES.items():
+        end_capital = float(np.percentile(distribution["final_capital"], percentile))
+        profit = end_capital - total_contribution
+        tax = calculate_tax(profit, tax_rate)
 
+        simulation_results[scenario] = {
+            "Final Capital": end_capital,
+            "Earnings": profit,
+            "Tax": tax,
+            "Percentile": percentile
+        }
 
-def perform_simulation(selected_funds, allocations, fund_data, contribution, duration, tax_rate):
-    months = duration * 12
-    simulation_results = {"Optimistic": {}, "Expected": {}, "Pessimistic": {}}
-    
-    weighted_average_return = calculate_weighted_average_return(selected_funds, allocations, fund_data)
-    
-    for scenario in simulation_results.keys():
-        total_capital, total_contributions = run_simulation(selected_funds, allocations, fund_data, contribution, months, scenario, weighted_average_return)
-        
-        end_capital = total_capital[-1]
-        total_contribution = total_contributions.sum()
+    return (simulation_results, distribution) if return_distribution else simulation_results
+
+def run_deterministic_scenarios(selected_funds, allocations, fund_data, contribution, months, tax_rate, fund_statistics=None):
+    scenarios = ["Optimistic", "Expected", "Pessimistic"]
+    simulation_results = {}
+
+    weighted_average_return = calculate_weighted_average_return(selected_funds, allocations, fund_data, fund_statistics=fund_statistics)
+    total_capital, total_contributions = run_simulation_batch(
+        selected_funds, allocations, fund_data, contribution, months, scenarios, weighted_average_return,
+        fund_statistics=fund_statistics
+    )
+    total_contribution = total_contributions.sum()
+
+    for scenario, capital in zip(scenarios, total_capital):
+        end_capital = capital[-1]
         profit = end_capital - total_contribution
         tax = calculate_tax(profit, tax_rate)
 
@@ -105,3 +138,44 @@ def perform_simulation(selected_funds, allocations, fund_data, contribution, dur
 
     return simulation_results
 
+def create_summary(simulation_results, paid_in, setup_cost_total, death_benefit_option, guarantee_rate, tax_rate, distribution=None,
+                   backtest_statistics=None):
+    result_summary = []
+    for scenario, result in simulation_results.items():
+        final_capital = result["Final Capital"]
+        gross_earnings = result["Earnings"]
+        tax = calculate_tax(gross_earnings, tax_rate)
+        after_tax = final_capital - tax - setup_cost_total
+
+        death_benefit = max(paid_in, after_tax) if death_benefit_option else after_tax
+        contribution_guarantee = paid_in * guarantee_rate
+        guaranteed_payout = max(death_benefit, contribution_guarantee)
+
+        result_summary.append({
+            "Scenario": scenario,
+            "Paid-in Capital (EUR)": paid_in,
+            "Final Capital (EUR)": final_capital,
+            "Earnings (EUR)": gross_earnings,
+            "Tax (EUR)": tax,
+            "Setup Cost (EUR)": setup_cost_total,
+            "After Tax (EUR)": after_tax,
+            "Death Benefit (EUR)": death_benefit,
+            "Guaranteed Payout (EUR)": guaranteed_payout
+        })
+
+    summary_df = pd.DataFrame(result_summary)
+
+    if distribution is not None:
+        # Wahrscheinlichkeit, nach Steuern und Kosten unter dem eingezahlten Kapital zu landen
+        final_capital = distribution["final_capital"]
+        after_tax = final_capital - calculate_tax(final_capital - paid_in, tax_rate) - setup_cost_total
+        summary_df["Probability Below Paid-in (%)"] = np.mean(after_tax < paid_in) * 100
+
+    if backtest_statistics is not None:
+        # Historische Verteilung über alle möglichen Startmonate
+        summary_df["Backtest Min Final Capital (EUR)"] = backtest_statistics["min"]
+        summary_df["Backtest Median Final Capital (EUR)"] = backtest_statistics["median"]
+        summary_df["Backtest Max Final Capital (EUR)"] = backtest_statistics["max"]
+        summary_df["Backtest Shortfall Probability (%)"] = backtest_statistics["shortfall_probability"] * 100
+
+    return summary_df
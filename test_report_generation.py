@@ -0,0 +1,21 @@
+import pandas as pd
+
+from report_generation import generate_pdf_report, render_allocation_pie
+
+def _summary_df():
+    return pd.DataFrame({
+        "Scenario": ["Pessimistic", "Neutral", "Optimistic"],
+        "Paid-in Capital (EUR)": [24000.0] * 3,
+        "After Tax (EUR)": [20000.0, 30000.0, 45000.0],
+        "Guaranteed Payout (EUR)": [12000.0] * 3,
+    })
+
+def test_reports_with_different_names_in_one_process():
+    # Jedes Dokument subsettet seine eigene Schrift: spätere Berichte mit neuen
+    # Zeichen dürfen nicht an den Glyphen früherer Berichte scheitern
+    summary_df = _summary_df()
+    chart = render_allocation_pie(["Fund A", "Fund B"], {"Fund A": 60, "Fund B": 40})
+    for client in ["Alice", "Bob", "Quinn Zed", "Client 0 Ä", "Jürgen Ωmega"]:
+        pdf_buffer = generate_pdf_report(summary_df, "Advisor", client, chart, chart,
+                                         100, 20, 0.01, 0.02, True, "50%")
+        assert pdf_buffer.getvalue().startswith(b"%PDF")
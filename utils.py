@@ -1,2 +1,11 @@
+import pandas as pd
+
 def calculate_tax(profit, tax_rate):
     return profit * tax_rate
+
+def get_close_prices(data):
+    # yfinance liefert je nach Version MultiIndex-Spalten ('Close', ticker)
+    close = data['Close']
+    if isinstance(close, pd.DataFrame):
+        close = close.iloc[:, 0]
+    return close